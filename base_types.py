@@ -2,11 +2,13 @@ import itertools
 from abc import ABC, abstractmethod
 from copy import copy
 from enum import Enum
-from typing import List
+from typing import Iterator, List
 
 import numpy as np
 import pandas as pd
 
+from executors import AsyncExecutor, get_default_executor
+
 
 class ExcelConstants:
     MAX_EXCEL_COLUMNS_COUNT = 16384
@@ -141,6 +143,114 @@ class CellOffset(CellPosition):
         return f'CellOffset(col={self._col}, row={self._row})'
 
 
+class PositionSet:
+    """
+    Набор zero-based позиций ячеек в двух массивах int32: строки и столбцы.
+    Замена списку CellPosition для больших результатов: смещение, проверка границ, пересечение и объединение
+    выполняются над массивами целиком. При итерации объекты CellPosition создаются по одному.
+    """
+    _KEY_BASE = 2 ** 32
+
+    def __init__(self, rows: [np.ndarray, list] = (), cols: [np.ndarray, list] = ()):
+        self._rows = np.asarray(rows, dtype=np.int32).ravel()
+        self._cols = np.asarray(cols, dtype=np.int32).ravel()
+        if len(self._rows) != len(self._cols):
+            raise Exception('The "rows" and "cols" must have the same length')
+
+    @classmethod
+    def from_coords(cls, coords: np.ndarray) -> 'PositionSet':
+        """
+        Из массива N x 2 (строка, столбец), как у AllCellPositionsFinder.get_positions_array
+        """
+        coords = np.asarray(coords).reshape(-1, 2)
+        return cls(rows=coords[:, 0], cols=coords[:, 1])
+
+    @classmethod
+    def from_positions(cls, positions: List[CellPosition]) -> 'PositionSet':
+        return cls(rows=[position.row for position in positions], cols=[position.col for position in positions])
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._rows
+
+    @property
+    def cols(self) -> np.ndarray:
+        return self._cols
+
+    @property
+    def excel_cells(self) -> List[str]:
+        """
+        Адреса ячеек в стиле Excel: ['A1', 'C10', ...]
+        """
+        labels = np.asarray(ExcelConstants.ALL_COLUMNS_LABELS, dtype=object)[self._cols]
+        return (labels + (self._rows.astype(np.int64) + 1).astype(str).astype(object)).tolist()
+
+    def to_coords(self) -> np.ndarray:
+        return np.stack([self._rows, self._cols], axis=1)
+
+    def in_scope(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Булев массив: позиция внутри df. Отбросить позиции вне df: position_set[position_set.in_scope(df)]
+        """
+        rows_cnt, col_cnt = df.shape
+        return (self._rows >= 0) & (self._rows < rows_cnt) & (self._cols >= 0) & (self._cols < col_cnt)
+
+    def intersection(self, other: 'PositionSet') -> 'PositionSet':
+        """
+        Позиции, которые есть в обоих наборах, без повторов построчно
+        """
+        return self._from_keys(np.intersect1d(self._get_keys(), other._get_keys()))
+
+    def union(self, other: 'PositionSet') -> 'PositionSet':
+        """
+        Позиции из обоих наборов без повторов построчно
+        """
+        return self._from_keys(np.union1d(self._get_keys(), other._get_keys()))
+
+    def _get_keys(self) -> np.ndarray:
+        # Одно int64 число на позицию, порядок чисел совпадает с построчным порядком позиций.
+        # Столбец сдвигается на 2 ** 31, чтобы отрицательные столбцы (после смещения) не ломали порядок
+        return self._rows.astype(np.int64) * self._KEY_BASE + (self._cols.astype(np.int64) + self._KEY_BASE // 2)
+
+    @classmethod
+    def _from_keys(cls, keys: np.ndarray) -> 'PositionSet':
+        rows, cols = np.divmod(keys, cls._KEY_BASE)
+        return cls(rows=rows, cols=cols - cls._KEY_BASE // 2)
+
+    def __add__(self, other: CellOffset) -> 'PositionSet':
+        # Как и у CellPosition, не заданная часть смещения равна 0
+        row = 0 if other.row is None else other.row
+        col = 0 if other.col is None else other.col
+        return PositionSet(rows=self._rows + np.int32(row), cols=self._cols + np.int32(col))
+
+    def __and__(self, other: 'PositionSet') -> 'PositionSet':
+        return self.intersection(other)
+
+    def __or__(self, other: 'PositionSet') -> 'PositionSet':
+        return self.union(other)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return CellPosition(row=int(self._rows[item]), col=int(self._cols[item]))
+        # Срез, булева маска или массив номеров
+        return PositionSet(rows=self._rows[item], cols=self._cols[item])
+
+    def __iter__(self) -> Iterator[CellPosition]:
+        for row, col in zip(self._rows.tolist(), self._cols.tolist()):
+            yield CellPosition(row=row, col=col)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __eq__(self, other):
+        if isinstance(other, PositionSet):
+            return np.array_equal(self._rows, other.rows) and np.array_equal(self._cols, other.cols)
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f'PositionSet(size={len(self._rows)})'
+
+
 class ExcelCell:
     """
     One-based адрес ячейки в стиле Excel: А1.
@@ -243,8 +353,32 @@ class ExcelCell:
         return f'ExcelCell(cell_name="{self._cell_name}")'
 
 
+class DataChunk:
+    """
+    Блок строк листа. row_offset - zero-based номер строки листа, с которой начинается блок.
+    Индекс df внутри блока начинается с 0.
+    """
+    def __init__(self, df: pd.DataFrame, row_offset: int):
+        self._df = df
+        self._row_offset = row_offset
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._df
+
+    @property
+    def row_offset(self) -> int:
+        return self._row_offset
+
+    def __repr__(self):
+        return f'DataChunk(df, row_offset={self._row_offset})'
+
+
 class ValueFinderAbstract(ABC):
     condition_type = ''
+    # Совпадение ячейки зависит только от её значения, а не от других ячеек столбца
+    # (например, от того, строковый ли столбец). Тогда маску можно считать по блокам строк df
+    cell_wise = False
 
     def __init__(self):
         self.df = None
@@ -253,6 +387,38 @@ class ValueFinderAbstract(ABC):
     @abstractmethod
     def get_all_indexes(self, axis: int): raise NotImplementedError
 
+    def get_mask(self) -> np.ndarray:
+        """
+        Булева матрица размера df: True в совпавших ячейках. Реализуется не всеми поисковиками
+        """
+        raise NotImplementedError
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        """
+        Отсортированные плоские позиции совпавших ячеек df (row * cols_cnt + col), если поисковик ищет по индексу
+        (use_index=True), иначе None: тогда совпадения берутся из маски (см. get_mask)
+        """
+        return None
+
+    def _mask_to_indexes(self, mask: np.ndarray, axis: int) -> np.array:
+        """
+        Метки строк (axis=1) или столбцов (axis=0) df, в которых в маске есть хотя бы одно True
+        """
+        labels = self.df.index.values if axis == 1 else self.df.columns.values
+        return labels[mask.any(axis=axis)]
+
+    def _positions_to_indexes(self, positions: np.ndarray, axis: int) -> np.array:
+        """
+        То же, что _mask_to_indexes, но по плоским позициям ячеек (row * cols_cnt + col)
+        """
+        if axis == 1:
+            labels = self.df.index.values
+            nums = np.unique(positions // self.df.shape[1])
+        else:
+            labels = self.df.columns.values
+            nums = np.unique(positions % self.df.shape[1])
+        return labels[nums]
+
 
 class CellOffsetAction:
     def __init__(self, cell_offset: CellOffset):
@@ -271,6 +437,16 @@ class CellOffsetAction:
             res = CellPosition()
         return res
 
+    def get_position_set(self, positions: PositionSet) -> PositionSet:
+        """
+        get_position сразу для всех позиций: смещение одним сложением массивов, позиции вне df отбрасываются
+        """
+        if self._df is None:
+            raise Exception('_df must not be None')
+
+        res = positions + self._cell_offset
+        return res[res.in_scope(df=self._df)]
+
 
 class PositionFinderAbstract(ABC):
     def __init__(self, df: pd.DataFrame = None, sr: pd.Series = None):
@@ -342,6 +518,13 @@ class FilterDfAbstract(ABC):
             df.fillna(0, inplace=True)
         return df
 
+    async def ares(self, *args, executor: AsyncExecutor = None, **kwargs) -> pd.DataFrame:
+        """
+        res для asyncio кода: фильтрация выполняется в пуле потоков executor (по умолчанию общем)
+        """
+        executor = get_default_executor() if executor is None else executor
+        return await executor.run(self.res, *args, **kwargs)
+
     def _filter_df_ltrb(self, start_position: CellPosition, end_position: CellPosition) -> pd.DataFrame:
         res_df = pd.DataFrame()
         if start_position and end_position and start_position <= end_position:
@@ -377,6 +560,29 @@ class NeighborCell:
     def is_not_neighbor(self, cell: [CellPosition, ExcelCell]):
         return not self.is_neighbor(cell=cell)
 
+    def get_mask(self, positions: PositionSet) -> np.ndarray:
+        """
+        is_neighbor сразу для всех позиций: булев массив длины positions.
+        Смещение, проверка границ, выборка значений соседей и сравнение - над массивами целиком
+        """
+        shifted = positions + self._cell_offset
+        in_scope = shifted.in_scope(df=self._df)
+        values = self._df.to_numpy()[shifted.rows[in_scope], shifted.cols[in_scope]].astype(object)
+        value = self._cell_value.value
+        if value is None or pd.isnull(value):
+            # Как в CellValue: '' - то же, что и пустое значение
+            matched = pd.isnull(values) | (values == '')
+        else:
+            matched = np.asarray(values == value, dtype=bool)
+            if isinstance(value, float):
+                # float с float CellValue сравнивает по записи (0.0 и -0.0 различны), поэтому совпавшие
+                # перепроверяются. Записи различных float не совпадают, т.е. новых совпадений не бывает
+                for num in np.flatnonzero(matched):
+                    matched[num] = self._cell_value == CellValue(value=values[num])
+        res = np.zeros(len(positions), dtype=bool)
+        res[in_scope] = matched
+        return res
+
     def __repr__(self):
         return f'NeighborCell(df, {self._cell_value.__repr__()}, {self._cell_offset.__repr__()})'
 
@@ -398,6 +604,17 @@ class NeighborsContainer:
                 res = False
         return res
 
+    def get_mask(self, positions: PositionSet) -> np.ndarray:
+        """
+        is_neighbors_for сразу для всех позиций: булев массив длины positions
+        """
+        res = np.ones(len(positions), dtype=bool)
+        for neighbor in self._neighbors:
+            if not res.any():
+                break
+            res &= neighbor.get_mask(positions=positions)
+        return res
+
 
 class Indexes:
     """
@@ -0,0 +1,209 @@
+import importlib.util
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+
+class ExcelBackendAbstract(ABC):
+    """
+    Парсер листа Excel в df с header=None.
+    Все парсеры должны давать одинаковый df: целые float -> int, пустые ячейки -> NaN.
+    """
+    name = ''
+    # Модуль, без которого парсер недоступен
+    required_module = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return cls.required_module is None or importlib.util.find_spec(cls.required_module) is not None
+
+    @abstractmethod
+    def read_sheet(self, file_path: str, sheet_name: [str, int]) -> pd.DataFrame: raise NotImplementedError
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class PandasBackend(ExcelBackendAbstract):
+    """
+    pd.read_excel, движок выбирает pandas по типу файла
+    """
+    name = 'pandas'
+    engine = None
+
+    def read_sheet(self, file_path: str, sheet_name: [str, int]) -> pd.DataFrame:
+        with open(file_path, 'rb') as xls:
+            df = pd.read_excel(xls, sheet_name=sheet_name, header=None, engine=self.engine)
+        return df
+
+
+class OpenpyxlBackend(PandasBackend):
+    name = 'openpyxl'
+    engine = 'openpyxl'
+    required_module = 'openpyxl'
+
+
+class CalamineBackend(PandasBackend):
+    """
+    Rust парсер python-calamine, если установлен
+    """
+    name = 'calamine'
+    engine = 'calamine'
+    required_module = 'python_calamine'
+
+
+class OpenpyxlStreamBackend(ExcelBackendAbstract):
+    """
+    Построчное чтение openpyxl в read-only режиме. Типы столбцов выводятся так же, как в pd.read_excel
+    (см. rows_to_df)
+    """
+    name = 'openpyxl_stream'
+    required_module = 'openpyxl'
+
+    def read_sheet(self, file_path: str, sheet_name: [str, int]) -> pd.DataFrame:
+        with read_only_worksheet(file_path=file_path, sheet_name=sheet_name) as sheet:
+            rows = list(iter_sheet_rows(sheet))
+        return rows_to_df(rows) if rows else pd.DataFrame()
+
+
+AUTO_BACKEND = 'auto'
+BACKENDS = {backend.name: backend for backend in [PandasBackend, OpenpyxlBackend, CalamineBackend,
+                                                  OpenpyxlStreamBackend]}
+# Порядок выбора в режиме auto, если замеров ещё нет
+BACKENDS_PRIORITY = ['calamine', 'openpyxl_stream', 'openpyxl', 'pandas']
+DEFAULT_BENCHMARK_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'tds', 'excel_backends.json')
+
+
+def get_available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.is_available()]
+
+
+def get_backend(name: str = AUTO_BACKEND, benchmark_path: str = DEFAULT_BENCHMARK_PATH) -> ExcelBackendAbstract:
+    if name == AUTO_BACKEND:
+        name = get_fastest_backend_name(benchmark_path=benchmark_path)
+    if name not in BACKENDS:
+        raise Exception(f'Unknown excel backend "{name}". Available: {", ".join(BACKENDS)}')
+    if not BACKENDS[name].is_available():
+        raise Exception(f'Excel backend "{name}" is not installed')
+    return BACKENDS[name]()
+
+
+def get_fastest_backend_name(benchmark_path: str = DEFAULT_BENCHMARK_PATH) -> str:
+    """
+    Самый быстрый из установленных парсеров по сохранённым замерам (см. benchmark_backends).
+    Если замеров нет, то первый установленный из BACKENDS_PRIORITY.
+    """
+    available = get_available_backends()
+    throughputs = {}
+    if benchmark_path and os.path.isfile(benchmark_path):
+        with open(benchmark_path, encoding='utf-8') as benchmark_file:
+            throughputs = json.load(benchmark_file).get('cells_per_second', {})
+    measured = [name for name in available if name in throughputs]
+    if measured:
+        res = max(measured, key=lambda name: throughputs[name])
+    else:
+        res = [name for name in BACKENDS_PRIORITY if name in available][0]
+    return res
+
+
+def benchmark_backends(file_path: str, sheet_name: [str, int] = 0, repeats: int = 3,
+                       benchmark_path: [str, None] = DEFAULT_BENCHMARK_PATH) -> Dict[str, float]:
+    """
+    Замер скорости парсинга (ячеек в секунду, лучшая из repeats попыток) всеми установленными парсерами
+    на примере file_path. Если задан benchmark_path, то результат сохраняется туда для режима auto.
+    """
+    throughputs = {}
+    for name in get_available_backends():
+        backend = BACKENDS[name]()
+        best_seconds = None
+        cells_cnt = 0
+        for _ in range(repeats):
+            started = time.perf_counter()
+            df = backend.read_sheet(file_path=file_path, sheet_name=sheet_name)
+            seconds = time.perf_counter() - started
+            cells_cnt = df.size
+            best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+        throughputs[name] = cells_cnt / best_seconds if best_seconds else 0.0
+
+    if benchmark_path:
+        os.makedirs(os.path.dirname(os.path.abspath(benchmark_path)), exist_ok=True)
+        with open(benchmark_path, 'w', encoding='utf-8') as benchmark_file:
+            json.dump({'file_path': os.path.abspath(file_path), 'cells_per_second': throughputs}, benchmark_file,
+                      indent=2)
+    return throughputs
+
+
+@contextmanager
+def read_only_worksheet(file_path: str, sheet_name: [str, int]):
+    """
+    Лист книги, открытой openpyxl в read-only режиме. Книга закрывается при выходе
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        if isinstance(sheet_name, int):
+            yield workbook.worksheets[sheet_name]
+        else:
+            yield workbook[sheet_name]
+    finally:
+        workbook.close()
+
+
+def iter_sheet_rows(sheet) -> Iterator[list]:
+    """
+    Строки листа в виде списков приведённых значений, как в pd.read_excel:
+    пустые ячейки в конце строки и пустые строки в конце листа отбрасываются.
+    """
+    # В read-only режиме размеры листа из файла могут быть неверными
+    sheet.reset_dimensions()
+    # Пустые строки откладываются, пока не встретится непустая: в конце листа они не нужны
+    empty_rows_cnt = 0
+    for row in sheet.rows:
+        values = [convert_excel_cell(cell) for cell in row]
+        while values and values[-1] is np.nan:
+            values.pop()
+        if not values:
+            empty_rows_cnt += 1
+            continue
+
+        for _ in range(empty_rows_cnt):
+            yield []
+        empty_rows_cnt = 0
+        yield values
+
+
+def convert_excel_cell(cell):
+    """
+    Приведение значения ячейки openpyxl аналогично pd.read_excel
+    """
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if cell.value is None or cell.data_type == TYPE_ERROR:
+        res = np.nan
+    elif cell.data_type == TYPE_NUMERIC:
+        res = int(cell.value)
+        if res != cell.value:
+            res = float(cell.value)
+    else:
+        res = cell.value
+    return res
+
+
+def rows_to_df(rows: list) -> pd.DataFrame:
+    """
+    Строки разной длины дополняются NaN до самой длинной. Типы столбцов выводит тот же TextParser, что и
+    в pd.read_excel: bool столбец с пропусками - float, текст из цифр - число, True в столбце с 1 - 1 и т.п.
+    """
+    width = max(len(row) for row in rows)
+    if not width:
+        return pd.DataFrame(index=range(len(rows)))
+    parser = TextParser([row + [np.nan] * (width - len(row)) for row in rows], header=None, skip_blank_lines=False)
+    return parser.read()
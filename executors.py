@@ -0,0 +1,71 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+
+class AsyncExecutor:
+    """
+    Выполнение блокирующих вызовов (парсинг, поиск) из asyncio кода в отдельном пуле потоков,
+    чтобы не останавливать цикл событий.
+    Одновременно выполняется не больше max_workers вызовов, остальные ждут своей очереди в цикле событий,
+    а не в очереди пула. Поэтому отмена ожидающей задачи снимает вызов до его начала.
+    Уже начавшийся вызов прервать нельзя: задача отменяется, а результат вызова отбрасывается.
+    """
+    def __init__(self, max_workers: int = 4):
+        if max_workers < 1:
+            raise Exception('The "max_workers" must be positive')
+        self._max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tds')
+        self._semaphores = {}
+        self._lock = Lock()
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        async with self._get_semaphore(loop):
+            return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _get_semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        # Семафор asyncio привязан к циклу событий, у каждого цикла свой
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                for closed_loop in [item for item in self._semaphores if item.is_closed()]:
+                    del self._semaphores[closed_loop]
+                semaphore = asyncio.Semaphore(self._max_workers)
+                self._semaphores[loop] = semaphore
+        return semaphore
+
+    def __repr__(self):
+        return f'AsyncExecutor(max_workers={self._max_workers})'
+
+
+_default_executor = None
+_default_executor_lock = Lock()
+
+
+def get_default_executor() -> AsyncExecutor:
+    """
+    Общий исполнитель для aget_df и ares, если другой не передан. Создаётся при первом обращении
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = AsyncExecutor()
+    return _default_executor
+
+
+def set_default_executor(executor: AsyncExecutor):
+    """
+    Заменить общий исполнитель, например чтобы задать свой лимит потоков. Старый исполнитель не закрывается
+    """
+    global _default_executor
+    with _default_executor_lock:
+        _default_executor = executor
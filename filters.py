@@ -2,6 +2,7 @@ from typing import List
 
 from base_types import CellValue, CellPosition, CellOffset, ExcelCell, FilterDfAbstract, NeighborCell
 from position_finders import FirstCellPositionFinder, FirstCellPositionFinderOffset, AllCellPositionsFinder
+from providers import ExcelDataProvider
 
 
 class ByValueLTRBFilterDF(FilterDfAbstract):
@@ -45,6 +46,25 @@ class ByExcelCellLTRBFilterDF(FilterDfAbstract):
         return res_df
 
 
+class ByExcelCellLTRBFilterProvider(FilterDfAbstract):
+    """
+    То же, что ByExcelCellLTRBFilterDF, но лист целиком не загружается:
+    провайдер читает только нужный прямоугольник.
+    """
+    def __init__(self, provider: ExcelDataProvider, sheet_name: [str, int]):
+        super().__init__(df=None)
+        self._provider = provider
+        self._sheet_name = sheet_name
+
+    def _filter(self, start_position: ExcelCell, end_position: ExcelCell):
+        res_df = self._provider.get_df_ltrb(self._sheet_name, start_position, end_position)
+        return res_df
+
+    def __repr__(self):
+        cls_name = self.__class__.__name__
+        return f'{cls_name}(provider, "{self._sheet_name}")'
+
+
 class ByValueNeighborhoodsLTRBFilterDF(FilterDfAbstract):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,803 @@
+import bisect
+import re
+import sys
+import weakref
+
+import numpy as np
+import pandas as pd
+from pandas.core.dtypes.common import is_string_dtype
+
+
+class Normalization:
+    """
+    Приведение строк для сравнения без учёта регистра и пробелов: 'Общий  итог ' и 'общий итог' равны.
+    Одинаково настроенные экземпляры равны, по ним кэшируются приведённые значения df.
+    """
+    _spaces = re.compile(r'\s+')
+
+    def __init__(self, casefold: bool = True, strip: bool = True, collapse_spaces: bool = True,
+                 unify_yo: bool = False):
+        """
+        :param casefold: без учёта регистра
+        :param strip: без пробелов в начале и в конце
+        :param collapse_spaces: несколько пробельных символов подряд - один пробел
+        :param unify_yo: ё и е не различаются
+        """
+        self._casefold = casefold
+        self._strip = strip
+        self._collapse_spaces = collapse_spaces
+        self._unify_yo = unify_yo
+
+    @property
+    def key(self) -> tuple:
+        return self._casefold, self._strip, self._collapse_spaces, self._unify_yo
+
+    def __call__(self, value: str) -> str:
+        if self._collapse_spaces:
+            value = self._spaces.sub(' ', value)
+        if self._strip:
+            value = value.strip()
+        if self._casefold:
+            value = value.casefold()
+        if self._unify_yo:
+            value = value.replace('ё', 'е').replace('Ё', 'Е')
+        return value
+
+    def __eq__(self, other):
+        return isinstance(other, Normalization) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'Normalization(casefold={self._casefold}, strip={self._strip}, ' \
+               f'collapse_spaces={self._collapse_spaces}, unify_yo={self._unify_yo})'
+
+
+class TypedGrid:
+    """
+    Типизированное представление df для быстрого поиска:
+    - kinds: тип каждой ячейки (EMPTY, NUMBER, STRING, BOOL, OTHER);
+    - numbers: float64 плоскость, значения NUMBER и BOOL ячеек, в остальных NaN;
+    - codes: int32 плоскость, коды строк в общем словаре strings, в остальных -1;
+    - empty: пустые ячейки (None, NaN, NaT, '').
+    Ячейки, которые нельзя точно положить в плоскости (даты, int за пределами 2^53 и т.п.), имеют тип OTHER
+    и сравниваются как python объекты.
+    Сравнение совпадает с df.eq: 1 == 1.0 == True, строки только со строками.
+    """
+    EMPTY = 0
+    NUMBER = 1
+    STRING = 2
+    BOOL = 3
+    OTHER = 4
+
+    # Целые больше по модулю не представимы в float64 точно
+    MAX_EXACT_INT = 2 ** 53
+
+    def __init__(self, df: pd.DataFrame):
+        cols_cnt = df.shape[1]
+        self._shape = df.shape
+        self._kinds = np.full(df.shape, self.EMPTY, dtype=np.int8)
+        self._numbers = np.full(df.shape, np.nan, dtype=np.float64)
+        self._codes = np.full(df.shape, -1, dtype=np.int32)
+
+        strings_parts = []
+        others_positions = []
+        others_values = []
+        for col_num in range(cols_cnt):
+            seria = df.iloc[:, col_num]
+            if isinstance(seria.dtype, np.dtype) and seria.dtype.kind in 'fiub':
+                # Числовые столбцы без python объектов
+                values = seria.to_numpy()
+                if seria.dtype.kind == 'b':
+                    self._kinds[:, col_num] = self.BOOL
+                elif seria.dtype.kind == 'f':
+                    self._kinds[:, col_num] = np.where(np.isnan(values), self.EMPTY, self.NUMBER)
+                else:
+                    self._kinds[:, col_num] = self.NUMBER
+                    big_rows = np.flatnonzero(np.abs(values) >= self.MAX_EXACT_INT)
+                    if len(big_rows):
+                        self._kinds[big_rows, col_num] = self.OTHER
+                        others_positions.append(big_rows * cols_cnt + col_num)
+                        others_values.append(values[big_rows].astype(object))
+                self._numbers[:, col_num] = np.where(self._kinds[:, col_num] == self.OTHER, np.nan, values)
+                continue
+
+            values = seria.to_numpy(dtype=object)
+            if isinstance(seria.dtype, pd.StringDtype):
+                # Строковый столбец: кроме пропусков только строки
+                kinds = np.where(seria.isna().to_numpy(), self.EMPTY, self.STRING).astype(np.int8)
+                kinds[(seria == '').to_numpy(dtype=bool, na_value=False)] = self.EMPTY
+            else:
+                kinds = self._get_kinds(values)
+
+            numbers_mask = (kinds == self.NUMBER) | (kinds == self.BOOL)
+            if numbers_mask.any():
+                self._numbers[numbers_mask, col_num] = values[numbers_mask].astype(np.float64)
+
+            strings_mask = kinds == self.STRING
+            if strings_mask.any():
+                strings_parts.append((col_num, np.flatnonzero(strings_mask), values[strings_mask]))
+
+            others_mask = kinds == self.OTHER
+            if others_mask.any():
+                rows = np.flatnonzero(others_mask)
+                others_positions.append(rows * cols_cnt + col_num)
+                others_values.append(values[others_mask])
+
+            self._kinds[:, col_num] = kinds
+
+        if strings_parts:
+            codes, strings = pd.factorize(np.concatenate([part[2] for part in strings_parts]))
+            start = 0
+            for col_num, rows, col_strings in strings_parts:
+                self._codes[rows, col_num] = codes[start:start + len(rows)]
+                start += len(rows)
+            self._strings = np.asarray(strings, dtype=object)
+        else:
+            self._strings = np.array([], dtype=object)
+        self._string_codes = None
+        self._value_index = None
+        self._normalized_codes = {}
+
+        self._empty = None
+
+        if others_positions:
+            self._others_positions = np.concatenate(others_positions)
+            self._others_values = np.concatenate(others_values)
+        else:
+            self._others_positions = np.array([], dtype=np.int64)
+            self._others_values = np.array([], dtype=object)
+
+    @property
+    def shape(self) -> tuple:
+        return self._shape
+
+    @property
+    def kinds(self) -> np.ndarray:
+        return self._kinds
+
+    @property
+    def numbers(self) -> np.ndarray:
+        return self._numbers
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes
+
+    @property
+    def strings(self) -> np.ndarray:
+        return self._strings
+
+    @property
+    def empty(self) -> np.ndarray:
+        """
+        Маска пустых ячеек (None, NaN, NaT, ''). Считается один раз и доступна только на чтение
+        """
+        if self._empty is None:
+            empty = self._kinds == self.EMPTY
+            empty.flags.writeable = False
+            self._empty = empty
+        return self._empty
+
+    @property
+    def value_index(self) -> 'ValueIndex':
+        """
+        Инвертированный индекс значений (см. ValueIndex). Строится при первом обращении
+        """
+        if self._value_index is None:
+            self._value_index = ValueIndex(self)
+        return self._value_index
+
+    def get_string_code(self, value: str) -> int:
+        """
+        Код строки в словаре strings или -1, если такой строки в df нет
+        """
+        if self._string_codes is None:
+            self._string_codes = {string: code for code, string in enumerate(self._strings)}
+        return self._string_codes.get(value, -1)
+
+    def get_normalized_codes(self, value: str, normalization: Normalization) -> np.ndarray:
+        """
+        Коды строк словаря strings, равных value после приведения normalization.
+        Приведённый словарь строится один раз для каждого варианта normalization
+        """
+        if normalization not in self._normalized_codes:
+            normalized_codes = {}
+            for code, string in enumerate(self._strings):
+                normalized_codes.setdefault(normalization(string), []).append(code)
+            self._normalized_codes[normalization] = {string: np.array(codes, dtype=np.int32)
+                                                     for string, codes in normalized_codes.items()}
+        return self._normalized_codes[normalization].get(normalization(value), np.array([], dtype=np.int32))
+
+    def eq_mask(self, value) -> np.ndarray:
+        """
+        Маска ячеек, равных value. Просматривается только плоскость, соответствующая типу value.
+        """
+        mask = np.zeros(self._shape, dtype=bool)
+        if isinstance(value, str):
+            code = self.get_string_code(value)
+            if code >= 0:
+                mask = self._codes == code
+        elif self._is_number(value):
+            if not isinstance(value, (int, np.integer)) or abs(value) <= self.MAX_EXACT_INT:
+                mask = self._numbers == value
+            else:
+                # float64 сравнение может дать ложное совпадение, только точное python сравнение
+                numbers_mask = (self._kinds == self.NUMBER) | (self._kinds == self.BOOL)
+                self._fill_python_eq(mask=mask, positions=np.flatnonzero(numbers_mask),
+                                     values=self._numbers[numbers_mask], value=value)
+        self._fill_python_eq(mask=mask, positions=self._others_positions, values=self._others_values, value=value)
+        return mask
+
+    def normalized_eq_mask(self, value: str, normalization: Normalization) -> np.ndarray:
+        """
+        Маска строковых ячеек, равных value после приведения normalization
+        """
+        codes = self.get_normalized_codes(value=value, normalization=normalization)
+        if not len(codes):
+            return np.zeros(self._shape, dtype=bool)
+        return np.isin(self._codes, codes)
+
+    def isin_mask(self, values: list) -> np.ndarray:
+        """
+        Маска ячеек, равных хотя бы одному из values
+        """
+        mask = np.zeros(self._shape, dtype=bool)
+        for value in values:
+            mask |= self.eq_mask(value)
+        return mask
+
+    def _fill_python_eq(self, mask: np.ndarray, positions: np.ndarray, values: np.ndarray, value):
+        for position, cell_value in zip(positions, values):
+            if cell_value == value:
+                mask.flat[position] = True
+
+    def _get_kinds(self, values: np.ndarray) -> np.ndarray:
+        kinds = np.full(values.shape, self.OTHER, dtype=np.int8)
+        empty_mask = pd.isna(values)
+        kinds[empty_mask] = self.EMPTY
+        types = np.frompyfunc(type, 1, 1)(values)
+        for value_type in set(types[~empty_mask]):
+            type_mask = (types == value_type) & ~empty_mask
+            if issubclass(value_type, str):
+                kinds[type_mask] = self.STRING
+                # '' считается пустым значением, как в CellValue
+                rows = np.flatnonzero(type_mask)
+                kinds[rows[values[rows] == '']] = self.EMPTY
+            elif issubclass(value_type, (bool, np.bool_)):
+                kinds[type_mask] = self.BOOL
+            elif issubclass(value_type, (int, np.integer)):
+                kinds[type_mask] = self.NUMBER
+                try:
+                    big_mask = np.abs(values[type_mask].astype(np.float64)) >= self.MAX_EXACT_INT
+                except OverflowError:
+                    big_mask = np.array([abs(value) >= self.MAX_EXACT_INT for value in values[type_mask]], dtype=bool)
+                kinds[np.flatnonzero(type_mask)[big_mask]] = self.OTHER
+            elif issubclass(value_type, (float, np.floating)):
+                kinds[type_mask] = self.NUMBER
+        return kinds
+
+    @classmethod
+    def get_kind(cls, value) -> int:
+        """
+        Тип значения так же, как у ячейки сетки: EMPTY, NUMBER, STRING, BOOL или OTHER
+        """
+        if isinstance(value, str):
+            return cls.EMPTY if value == '' else cls.STRING
+        if isinstance(value, (bool, np.bool_)):
+            return cls.BOOL
+        if isinstance(value, (int, np.integer)):
+            return cls.NUMBER if abs(value) < cls.MAX_EXACT_INT else cls.OTHER
+        if isinstance(value, (float, np.floating)):
+            return cls.EMPTY if np.isnan(value) else cls.NUMBER
+        return cls.EMPTY if pd.api.types.is_scalar(value) and pd.isna(value) else cls.OTHER
+
+    @staticmethod
+    def _is_number(value) -> bool:
+        # bool тоже число: в df.eq True == 1
+        return isinstance(value, (int, float, np.integer, np.floating, np.bool_))
+
+    def __repr__(self):
+        return f'TypedGrid(shape={self._shape}, strings={len(self._strings)}, others={len(self._others_values)})'
+
+
+class ValueIndex:
+    """
+    Инвертированный индекс сетки: значение -> отсортированные плоские позиции ячеек (row * cols_cnt + col).
+    Позиции строк и чисел хранятся в CSR виде: общий массив позиций, сгруппированных по значению, и смещения групп.
+    Поиск стоит O(log(значений) + совпадений) вместо просмотра всех ячеек.
+    Совпадения те же, что у TypedGrid.eq_mask.
+    """
+    def __init__(self, grid: TypedGrid):
+        self._shape = grid.shape
+        flat_kinds = grid.kinds.ravel()
+
+        # Строки: код строки в словаре сетки - номер группы
+        positions = np.flatnonzero(flat_kinds == TypedGrid.STRING)
+        codes = grid.codes.ravel()[positions]
+        self._string_positions = positions[np.argsort(codes, kind='stable')]
+        self._string_offsets = self._get_offsets(np.bincount(codes, minlength=len(grid.strings)))
+
+        # Числа и bool: группы по отсортированным уникальным значениям, 0.0 и -0.0 в одной группе
+        positions = np.flatnonzero((flat_kinds == TypedGrid.NUMBER) | (flat_kinds == TypedGrid.BOOL))
+        self._number_keys, inverse = np.unique(grid.numbers.ravel()[positions], return_inverse=True)
+        self._number_positions = positions[np.argsort(inverse, kind='stable')]
+        self._number_offsets = self._get_offsets(np.bincount(inverse, minlength=len(self._number_keys)))
+
+        self._empty_positions = np.flatnonzero(flat_kinds == TypedGrid.EMPTY)
+
+        # Прочие значения по python хэшу, нехэшируемые сравниваются перебором
+        self._others = {}
+        self._unhashable_others = []
+        for position, value in zip(grid._others_positions.tolist(), grid._others_values):
+            try:
+                self._others.setdefault(value, []).append(position)
+            except TypeError:
+                self._unhashable_others.append((position, value))
+        self._grid = grid
+
+    @property
+    def shape(self) -> tuple:
+        return self._shape
+
+    @property
+    def empty_positions(self) -> np.ndarray:
+        return self._empty_positions
+
+    def lookup(self, value, same_kind: bool = False) -> np.ndarray:
+        """
+        Отсортированные плоские позиции ячеек, равных value.
+        :param same_kind: только ячейки того же типа, что и value (см. TypedGrid.get_kind): False не равно 0
+        """
+        parts = []
+        if isinstance(value, str):
+            code = self._grid.get_string_code(value)
+            if code >= 0:
+                parts.append(self._string_positions[self._string_offsets[code]:self._string_offsets[code + 1]])
+        elif TypedGrid._is_number(value):
+            key_num = np.searchsorted(self._number_keys, value)
+            if key_num < len(self._number_keys) and self._number_keys[key_num] == value:
+                # Все ячейки группы равны одному float64, поэтому точное сравнение для большого int одно на группу
+                if not isinstance(value, (int, np.integer)) or abs(value) <= TypedGrid.MAX_EXACT_INT or \
+                        self._number_keys[key_num].item() == value:
+                    start = self._number_offsets[key_num]
+                    parts.append(self._number_positions[start:self._number_offsets[key_num + 1]])
+
+        try:
+            others = self._others.get(value)
+        except TypeError:
+            others = None
+        if others:
+            parts.append(np.array(others, dtype=np.int64))
+        unhashable = [position for position, cell_value in self._unhashable_others if cell_value == value]
+        if unhashable:
+            parts.append(np.array(unhashable, dtype=np.int64))
+
+        if not parts:
+            res = np.array([], dtype=np.int64)
+        elif len(parts) == 1:
+            res = parts[0]
+        else:
+            res = np.sort(np.concatenate(parts))
+        if same_kind:
+            res = res[self._grid.kinds.ravel()[res] == TypedGrid.get_kind(value)]
+        return res
+
+    def lookup_string_codes(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Отсортированные плоские позиции строковых ячеек с кодами codes (см. TypedGrid.strings)
+        """
+        parts = [self._string_positions[self._string_offsets[code]:self._string_offsets[code + 1]] for code in codes]
+        return np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+
+    def lookup_range(self, min_value=None, max_value=None, include_min: bool = True,
+                     include_max: bool = True) -> np.ndarray:
+        """
+        Отсортированные плоские позиции числовых ячеек (без bool) со значением в диапазоне от min_value до max_value.
+        Граница None - без ограничения. Числа в индексе отсортированы, поэтому диапазон - два бинарных поиска,
+        а позиции найденных чисел лежат в CSR массиве подряд.
+        """
+        if (min_value is not None and np.isnan(min_value)) or (max_value is not None and np.isnan(max_value)):
+            raise Exception('The range bounds must not be NaN')
+
+        start = 0
+        end = len(self._number_keys)
+        if min_value is not None:
+            start = np.searchsorted(self._number_keys, min_value, side='left' if include_min else 'right')
+        if max_value is not None:
+            end = np.searchsorted(self._number_keys, max_value, side='right' if include_max else 'left')
+        positions = self._number_positions[self._number_offsets[start]:self._number_offsets[max(start, end)]]
+        positions = positions[self._grid.kinds.ravel()[positions] == TypedGrid.NUMBER]
+
+        # Целые за пределами 2^53 хранятся среди прочих значений
+        others = []
+        for value, value_positions in self._others.items():
+            if not isinstance(value, (int, np.integer)) or isinstance(value, (bool, np.bool_)):
+                continue
+            if min_value is not None and (value < min_value or (value == min_value and not include_min)):
+                continue
+            if max_value is not None and (value > max_value or (value == max_value and not include_max)):
+                continue
+            others += value_positions
+        if others:
+            positions = np.concatenate([positions, np.array(others, dtype=np.int64)])
+        return np.sort(positions)
+
+    def lookup_many(self, values: list) -> np.ndarray:
+        """
+        Отсортированные плоские позиции ячеек, равных хотя бы одному из values
+        """
+        parts = [self.lookup(value) for value in values]
+        return np.unique(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+
+    def to_coords(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Плоские позиции -> массив N x 2 (номер строки, номер столбца)
+        """
+        rows, cols = np.divmod(positions, self._shape[1])
+        return np.stack([rows, cols], axis=1)
+
+    @staticmethod
+    def _get_offsets(counts: np.ndarray) -> np.ndarray:
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets
+
+    def __repr__(self):
+        return f'ValueIndex(shape={self._shape}, numbers={len(self._number_keys)}, ' \
+               f'strings={len(self._string_offsets) - 1})'
+
+
+class StringColumns:
+    """
+    Строковые столбцы df, приведённые к str (как s.astype(str)), для поиска по regex, началу и концу строки.
+    Все строковые столбцы склеены в одну серию, поэтому запрос - один векторный вызов .str на весь лист.
+    Нестроковые столбцы не приводятся и не просматриваются.
+    """
+    def __init__(self, df: pd.DataFrame):
+        self._shape = df.shape
+        self._col_nums = [col_num for col_num in range(df.shape[1]) if is_string_dtype(df.iloc[:, col_num])]
+        values = [df.iloc[:, col_num].astype(str).to_numpy(dtype=object) for col_num in self._col_nums]
+        self._values = pd.Series(np.concatenate(values) if values else [], dtype=object)
+        self._codes = None
+        self._uniques = None
+        self._positions = None
+        self._offsets = None
+        self._affix_index = None
+        self._trigram_index = None
+        self._normalized = {}
+
+    @property
+    def col_nums(self) -> list:
+        return self._col_nums
+
+    @property
+    def values(self) -> pd.Series:
+        """
+        Значения строковых столбцов подряд: столбец col_nums[0] целиком, затем col_nums[1] и т.д.
+        """
+        return self._values
+
+    @property
+    def codes(self) -> np.ndarray:
+        """
+        Номер различного значения (см. uniques) для каждого элемента values, -1 для пропусков
+        """
+        self._factorize()
+        return self._codes
+
+    @property
+    def uniques(self) -> np.ndarray:
+        """
+        Различные значения строковых столбцов
+        """
+        self._factorize()
+        return self._uniques
+
+    @property
+    def affix_index(self) -> 'AffixIndex':
+        """
+        Индекс для поиска по началу и концу строки (см. AffixIndex). Строится при первом обращении
+        """
+        if self._affix_index is None:
+            self._affix_index = AffixIndex(self)
+        return self._affix_index
+
+    @property
+    def trigram_index(self) -> 'TrigramIndex':
+        """
+        Индекс для поиска подстроки (см. TrigramIndex). Строится при первом обращении
+        """
+        if self._trigram_index is None:
+            self._trigram_index = TrigramIndex(self)
+        return self._trigram_index
+
+    def get_normalized(self, normalization: Normalization) -> 'StringColumns':
+        """
+        Те же столбцы после приведения normalization. Приводятся только различные значения, один раз
+        для каждого варианта normalization. У результата свои индексы начала, конца и триграмм
+        """
+        if normalization not in self._normalized:
+            self._normalized[normalization] = NormalizedStringColumns(string_columns=self,
+                                                                      normalization=normalization)
+        return self._normalized[normalization]
+
+    def codes_to_positions(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Отсортированные номера элементов values, равных различным значениям с номерами codes.
+        Элементы хранятся в CSR виде, как в ValueIndex: сгруппированы по коду, группа - срез общего массива.
+        """
+        if self._positions is None:
+            # Пропуски (код -1) остаются в строковых столбцах типа string и ни с чем не совпадают
+            positions = np.flatnonzero(self.codes >= 0)
+            self._positions = positions[np.argsort(self.codes[positions], kind='stable')]
+            self._offsets = ValueIndex._get_offsets(np.bincount(self.codes[positions], minlength=len(self.uniques)))
+        parts = [self._positions[self._offsets[code]:self._offsets[code + 1]] for code in codes]
+        return np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.int64)
+
+    def get_mask(self, func) -> np.ndarray:
+        """
+        Маска размера df. func получает серию строк и возвращает булеву серию, например lambda s: s.str.match(p)
+        """
+        return self._to_mask(func(self.values).to_numpy(dtype=bool))
+
+    def positions_to_mask(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Маска размера df по номерам элементов values
+        """
+        matched = np.zeros(len(self.codes), dtype=bool)
+        matched[positions] = True
+        return self._to_mask(matched)
+
+    def uniques_mask_to_mask(self, uniques_mask: np.ndarray) -> np.ndarray:
+        """
+        Маска различных значений (по uniques) -> маска размера df. Пропуски не совпадают ни с чем
+        """
+        return self._to_mask(np.append(uniques_mask, False)[self.codes])
+
+    def to_flat_positions(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Номера элементов values -> плоские позиции ячеек df (row * cols_cnt + col), без сортировки
+        """
+        col_order, rows = np.divmod(positions, self._shape[0])
+        return rows * self._shape[1] + np.asarray(self._col_nums, dtype=np.int64)[col_order]
+
+    def _to_mask(self, matched: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self._shape, dtype=bool)
+        if self._col_nums:
+            mask[:, self._col_nums] = matched.reshape(len(self._col_nums), self._shape[0]).T
+        return mask
+
+    def _factorize(self):
+        if self._codes is None:
+            codes, uniques = pd.factorize(self._values)
+            self._codes = codes
+            self._uniques = np.asarray(uniques, dtype=object)
+
+    def __repr__(self):
+        return f'StringColumns(shape={self._shape}, col_nums={self._col_nums})'
+
+
+class NormalizedStringColumns(StringColumns):
+    """
+    Строковые столбцы после приведения Normalization. Приведённые различные значения снова группируются:
+    'Итог' и 'итог ' становятся одним значением
+    """
+    def __init__(self, string_columns: StringColumns, normalization: Normalization):
+        self._shape = string_columns._shape
+        self._col_nums = string_columns.col_nums
+        normalized = np.array([normalization(value) for value in string_columns.uniques], dtype=object)
+        uniques_codes, uniques = pd.factorize(normalized)
+        # Код пропуска -1 указывает на последний элемент, т.е. снова на -1
+        self._codes = np.append(uniques_codes, -1)[string_columns.codes]
+        self._uniques = np.asarray(uniques, dtype=object)
+        self._values = None
+        self._positions = None
+        self._offsets = None
+        self._affix_index = None
+        self._trigram_index = None
+        self._normalized = {}
+        self._normalization = normalization
+
+    @property
+    def values(self) -> pd.Series:
+        if self._values is None:
+            values = np.append(self._uniques, np.nan)[self._codes]
+            self._values = pd.Series(values, dtype=object)
+        return self._values
+
+    def get_normalized(self, normalization: Normalization) -> StringColumns:
+        raise Exception('The string columns are already normalized')
+
+    def __repr__(self):
+        return f'NormalizedStringColumns(shape={self._shape}, {self._normalization!r})'
+
+
+class AffixIndex:
+    """
+    Индекс различных строк StringColumns для поиска по началу и концу строки:
+    различные строки по возрастанию и перевёрнутые различные строки по возрастанию.
+    Строки с общим началом в сортировке идут подряд, поэтому запрос - два бинарных поиска,
+    а затем выборка элементов найденных строк (см. StringColumns.codes_to_positions).
+    """
+    def __init__(self, string_columns: StringColumns):
+        uniques = string_columns.uniques
+        self._prefix_order = np.argsort(uniques, kind='stable')
+        self._prefix_sorted = uniques[self._prefix_order].tolist()
+        reversed_uniques = np.array([value[::-1] for value in uniques], dtype=object)
+        self._suffix_order = np.argsort(reversed_uniques, kind='stable')
+        self._suffix_sorted = reversed_uniques[self._suffix_order].tolist()
+
+        self._string_columns = string_columns
+
+    def startswith(self, prefix: str) -> np.ndarray:
+        """
+        Отсортированные номера элементов StringColumns.values, начинающихся с prefix
+        """
+        return self._lookup(sorted_values=self._prefix_sorted, order=self._prefix_order, prefix=prefix)
+
+    def endswith(self, suffix: str) -> np.ndarray:
+        """
+        Отсортированные номера элементов StringColumns.values, заканчивающихся на suffix
+        """
+        return self._lookup(sorted_values=self._suffix_sorted, order=self._suffix_order, prefix=suffix[::-1])
+
+    def _lookup(self, sorted_values: list, order: np.ndarray, prefix: str) -> np.ndarray:
+        start = bisect.bisect_left(sorted_values, prefix)
+        end = len(sorted_values)
+        # Первая строка больше всех строк с началом prefix: prefix с увеличенным последним символом
+        while prefix and ord(prefix[-1]) == sys.maxunicode:
+            prefix = prefix[:-1]
+        if prefix:
+            end = bisect.bisect_left(sorted_values, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start)
+
+        return self._string_columns.codes_to_positions(order[start:end])
+
+    def __repr__(self):
+        return f'AffixIndex(strings={len(self._prefix_sorted)})'
+
+
+class TrigramIndex:
+    """
+    Индекс триграмм различных строк StringColumns для поиска подстроки:
+    триграмма -> отсортированные номера различных строк, в которых она есть (в CSR виде).
+    Кандидаты - пересечение списков для всех триграмм подстроки, затем каждый кандидат проверяется через in.
+    Подстроки короче 3 символов проверяются перебором различных строк.
+    """
+    N = 3
+
+    def __init__(self, string_columns: StringColumns):
+        self._string_columns = string_columns
+        self._uniques = string_columns.uniques.tolist()
+
+        # Все триграммы всех строк подряд и номер строки для каждой, затем пары (триграмма, строка) без повторов,
+        # отсортированные по триграмме, - CSR списки номеров строк
+        trigrams = [value[start:start + self.N] for value in self._uniques for start in range(len(value) - self.N + 1)]
+        trigrams_cnt = [max(len(value) - self.N + 1, 0) for value in self._uniques]
+        string_codes = np.repeat(np.arange(len(self._uniques), dtype=np.int64), trigrams_cnt)
+        trigram_codes, trigrams_dictionary = pd.factorize(np.array(trigrams, dtype=object))
+        pairs = np.sort(trigram_codes.astype(np.int64) * len(self._uniques) + string_codes)
+        pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])] if len(pairs) else pairs
+        self._codes = pairs % max(len(self._uniques), 1)
+        self._offsets = ValueIndex._get_offsets(np.bincount(pairs // max(len(self._uniques), 1),
+                                                            minlength=len(trigrams_dictionary)))
+        self._trigrams = {trigram: trigram_num for trigram_num, trigram in enumerate(trigrams_dictionary)}
+
+    def contains(self, substring: str) -> np.ndarray:
+        """
+        Отсортированные номера элементов StringColumns.values, содержащих substring
+        """
+        return self._string_columns.codes_to_positions(self.get_codes(substring))
+
+    def get_codes(self, substring: str) -> np.ndarray:
+        """
+        Номера различных строк, содержащих substring
+        """
+        if len(substring) < self.N:
+            return np.array([code for code, value in enumerate(self._uniques) if substring in value], dtype=np.int64)
+
+        trigrams = {substring[start:start + self.N] for start in range(len(substring) - self.N + 1)}
+        if not all(trigram in self._trigrams for trigram in trigrams):
+            return np.array([], dtype=np.int64)
+        # Пересечение начинается с самого короткого списка
+        postings = sorted((self._get_posting(self._trigrams[trigram]) for trigram in trigrams), key=len)
+        candidates = postings[0]
+        for codes in postings[1:]:
+            candidates = np.intersect1d(candidates, codes, assume_unique=True)
+            if not len(candidates):
+                break
+        # Все триграммы на месте ещё не значит, что они идут подряд
+        return np.array([code for code in candidates.tolist() if substring in self._uniques[code]], dtype=np.int64)
+
+    def _get_posting(self, trigram_num: int) -> np.ndarray:
+        return self._codes[self._offsets[trigram_num]:self._offsets[trigram_num + 1]]
+
+    def __repr__(self):
+        return f'TrigramIndex(strings={len(self._uniques)}, trigrams={len(self._trigrams)})'
+
+
+class _GridRegistry:
+    """
+    Представления df (сетки, строковые столбцы). Представление живёт, пока жив df, и пересобирается, если у df
+    сменились размеры, индекс, столбцы или массивы значений (например, присвоен новый столбец).
+    Изменения отдельных ячеек inplace не отслеживаются: после них нужен invalidate_grid(df).
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._items = {}
+
+    def get(self, df: pd.DataFrame):
+        key = id(df)
+        item = self._items.get(key)
+        fingerprint = self._get_fingerprint(df)
+        if item is None or item[0]() is not df or not self._same_fingerprint(item[1], fingerprint):
+            grid = self._factory(df)
+            df_ref = weakref.ref(df, lambda _, key=key: self._items.pop(key, None))
+            self._items[key] = (df_ref, fingerprint, grid)
+        return self._items[key][2]
+
+    def contains(self, df: pd.DataFrame) -> bool:
+        """
+        Представление df уже построено и актуально
+        """
+        item = self._items.get(id(df))
+        return item is not None and item[0]() is df and self._same_fingerprint(item[1], self._get_fingerprint(df))
+
+    def invalidate(self, df: pd.DataFrame):
+        self._items.pop(id(df), None)
+
+    @staticmethod
+    def _get_fingerprint(df: pd.DataFrame) -> tuple:
+        arrays = []
+        for array in df._mgr.arrays:
+            try:
+                arrays.append(weakref.ref(array))
+            except TypeError:
+                arrays.append(array)
+        return df.shape, df.index, df.columns, arrays
+
+    @staticmethod
+    def _same_fingerprint(first: tuple, second: tuple) -> bool:
+        def deref(item):
+            return item() if isinstance(item, weakref.ref) else item
+
+        return first[0] == second[0] and first[1] is second[1] and first[2] is second[2] and \
+            len(first[3]) == len(second[3]) and \
+            all(deref(left) is deref(right) for left, right in zip(first[3], second[3]))
+
+
+_registry = _GridRegistry(factory=TypedGrid)
+_string_columns_registry = _GridRegistry(factory=StringColumns)
+
+
+def get_grid(df: pd.DataFrame) -> TypedGrid:
+    """
+    Сетка для df. Строится при первом обращении и переиспользуется поисковиками с use_index=True.
+    Изменения ячеек inplace не отслеживаются, поэтому поиск по умолчанию сетку не использует
+    """
+    return _registry.get(df)
+
+
+def get_string_columns(df: pd.DataFrame) -> StringColumns:
+    """
+    Строковые столбцы df. Приводятся к str при первом обращении и переиспользуются строковыми поисковиками
+    с use_index=True. Изменения ячеек inplace не отслеживаются, поэтому по умолчанию поисковики
+    приводят столбцы заново
+    """
+    return _string_columns_registry.get(df)
+
+
+def has_grid(df: pd.DataFrame) -> bool:
+    """
+    Сетка или строковые столбцы df уже построены, т.е. поиск по всему df не требует их построения
+    """
+    return _registry.contains(df) or _string_columns_registry.contains(df)
+
+
+def invalidate_grid(df: pd.DataFrame):
+    """
+    Сбросить сетку и строковые столбцы df, например после изменения ячеек inplace
+    """
+    _registry.invalidate(df)
+    _string_columns_registry.invalidate(df)
@@ -1,4 +1,14 @@
-from base_types import PositionFinderAbstract, CellValue, CellPosition, CellOffset
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from base_types import PositionFinderAbstract, ValueFinderAbstract, CellValue, CellPosition, CellOffset, \
+    CellOffsetAction, DataChunk, NeighborsContainer, PositionSet
+from grids import TypedGrid, get_grid
+
+# Первый блок строк при поиске первого совпадения, каждый следующий блок вдвое больше
+FIRST_MATCH_BLOCK_ROWS = 1024
 
 
 class AllRowNumsFinder(PositionFinderAbstract):
@@ -14,26 +24,170 @@ class AllColNumsFinder(PositionFinderAbstract):
 
 
 class AllCellPositionsFinder(PositionFinderAbstract):
+    """
+    Позиции всех подходящих ячеек построчно (row-major). Поисковик с индексом сразу отдаёт отсортированные
+    позиции (см. ValueFinderAbstract.get_flat_positions), для остальных матрица совпадений считается один раз
+    за проход, координаты берутся из np.nonzero.
+    """
     def get_position(self) -> CellPosition:
+        yield from self.get_position_set()
+
+    def get_positions_array(self) -> np.ndarray:
+        """
+        Позиции массивом N x 2 (строка, столбец) в том же порядке, что и get_position.
+        Объекты CellPosition не создаются: соседи и смещение применяются сразу ко всем позициям.
+        """
+        return self.get_position_set().to_coords().astype(np.int64)
+
+    def get_position_set(self) -> PositionSet:
+        """
+        Позиции в виде PositionSet: два массива вместо списка CellPosition
+        """
+        return _apply_actions(coords=self._get_coords(), neighbors_container=self.neighbors_container,
+                              cell_offset_action=self._cell_offset_action)
+
+    def _get_coords(self) -> np.ndarray:
+        positions = self.value_finder.get_flat_positions()
+        if positions is not None:
+            rows, cols = np.divmod(positions, self._df.shape[1])
+        else:
+            try:
+                mask = self.value_finder.get_mask()
+            except NotImplementedError:
+                return self._get_coords_by_rows()
+            rows, cols = np.nonzero(mask)
+        return np.stack([self._df.index.values[rows], self._df.columns.values[cols]], axis=1)
+
+    def _get_coords_by_rows(self) -> np.ndarray:
+        # Поисковик без маски: сначала строки, затем столбцы в каждой найденной строке
+        coords = []
         row_num_finder = AllRowNumsFinder(df=self._df)
         row_num_finder.value_finder = self.value_finder
         for row_position in row_num_finder.get_position():
             col_num_finder = AllColNumsFinder(sr=self._df.iloc[row_position.row, :])
             col_num_finder.value_finder = self.value_finder
             for col_position in col_num_finder.get_position():
-                position = row_position + col_position
-                if self.neighbors_container:
-                    if not self.neighbors_container.is_neighbors_for(position=position):
-                        continue
-                if self._cell_offset_action:
-                    position = self._cell_offset_action.get_position(position=position)
-                    if not position:
-                        continue
-                yield position
+                coords.append([row_position.row, col_position.col])
+        # Восстановить df в поисковике значений после поиска по строкам
+        self.value_finder = self.value_finder
+        return np.array(coords, dtype=np.int64).reshape(-1, 2)
+
+
+class BatchCellPositionsFinder:
+    """
+    Позиции сразу многих значений: все значения ищутся по одному индексу значений df (см. ValueIndex),
+    который строится один раз на вызов get_all_positions. В отличие от ExactValuesFinder, результат свой
+    для каждого значения, и у каждого значения могут быть свои соседи и смещение.
+    Значения различаются с учётом типа (см. get_key): False и 0 - разные значения, и False не находит ячейки с 0.
+    """
+    def __init__(self, df: pd.DataFrame, cell_values: List[CellValue] = None, use_index: bool = False):
+        """
+        :param use_index: брать индекс значений из общего кэша df (см. get_grid), а не строить на каждый вызов.
+        Изменения ячеек df inplace кэш не видит: после них нужен invalidate_grid(df).
+        """
+        self._df = df
+        self._use_index = use_index
+        self._items = {}
+        for cell_value in cell_values or []:
+            self.add(cell_value=cell_value)
+
+    def add(self, cell_value: CellValue, neighbors_container: NeighborsContainer = None,
+            cell_offset_action: CellOffsetAction = None):
+        key = self.get_key(cell_value)
+        if key in self._items:
+            raise Exception(f'The value {cell_value!r} has already been added')
+        if cell_offset_action is not None:
+            cell_offset_action._df = self._df
+        self._items[key] = (cell_value, neighbors_container, cell_offset_action)
+
+    def get_all_positions(self) -> Dict[tuple, List[CellPosition]]:
+        """
+        Ключ значения (см. get_key) -> позиции в порядке добавления значений
+        """
+        value_index = get_grid(self._df).value_index if self._use_index else TypedGrid(self._df).value_index
+        res = {}
+        for key, (cell_value, neighbors_container, cell_offset_action) in self._items.items():
+            if key[0] == TypedGrid.EMPTY:
+                positions = value_index.empty_positions
+            else:
+                positions = value_index.lookup(cell_value.value, same_kind=True)
+            rows, cols = value_index.to_coords(positions).T
+            coords = np.stack([self._df.index.values[rows], self._df.columns.values[cols]], axis=1)
+            res[key] = list(_apply_actions(coords=coords, neighbors_container=neighbors_container,
+                                           cell_offset_action=cell_offset_action))
+        return res
+
+    @staticmethod
+    def get_key(cell_value: CellValue) -> tuple:
+        """
+        Ключ значения в результате get_all_positions: (тип значения, как у ячеек сетки (см. TypedGrid.get_kind),
+        значение). Все варианты пустого значения - один ключ (TypedGrid.EMPTY, None)
+        """
+        kind = TypedGrid.get_kind(cell_value.value) if cell_value else TypedGrid.EMPTY
+        return (kind, None) if kind == TypedGrid.EMPTY else (kind, cell_value.value)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(df, values={len(self._items)})'
+
+
+class ChunkedCellPositionsFinder:
+    """
+    Поиск всех позиций по блокам строк (см. DataProviderAbstract.iter_chunks).
+    В памяти одновременно только один блок, позиции возвращаются в координатах листа.
+    Соседи и смещения не поддерживаются, т.к. они могут выходить за границы блока.
+    """
+    def __init__(self, chunks: Iterable[DataChunk]):
+        self._chunks = chunks
+        self.value_finder = None
+
+    def get_position(self) -> CellPosition:
+        if self.value_finder is None:
+            raise Exception('The "value_finder" is not set')
+
+        for chunk in self._chunks:
+            chunk_finder = AllCellPositionsFinder(df=chunk.df)
+            chunk_finder.value_finder = self.value_finder
+            yield from chunk_finder.get_position_set() + CellOffset(row=chunk.row_offset, col=0)
+
+    def get_all_positions(self):
+        return list(self.get_position())
+
+    def get_position_set(self) -> PositionSet:
+        """
+        Позиции всех блоков в одном PositionSet. Смещение блока прибавляется ко всем его позициям сразу
+        """
+        if self.value_finder is None:
+            raise Exception('The "value_finder" is not set')
+
+        rows = []
+        cols = []
+        for chunk in self._chunks:
+            chunk_finder = AllCellPositionsFinder(df=chunk.df)
+            chunk_finder.value_finder = self.value_finder
+            position_set = chunk_finder.get_position_set() + CellOffset(row=chunk.row_offset, col=0)
+            rows.append(position_set.rows)
+            cols.append(position_set.cols)
+        return PositionSet(rows=np.concatenate(rows), cols=np.concatenate(cols)) if rows else PositionSet()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(chunks)'
 
 
 class FirstRowNumFinder(PositionFinderAbstract):
+    """
+    Первая строка с совпадением. По df поиск идёт блоками строк (см. _find_first_cell) и останавливается
+    на первом совпадении, поэтому время зависит от положения совпадения, а не от размера листа
+    """
     def get_position(self) -> CellPosition:
+        if self._df is not None:
+            try:
+                cell = _find_first_cell(df=self._df, value_finder=self.value_finder)
+            except NotImplementedError:
+                # Поисковик без маски: по всему df
+                pass
+            else:
+                return CellPosition() if cell is None else CellPosition(row=cell[0])
+
         if self._df is not None:
             row_num_finder = AllRowNumsFinder(df=self._df)
         else:
@@ -69,7 +223,18 @@ class FirstColNumFinder(PositionFinderAbstract):
 
 
 class FirstCellPositionFinder(PositionFinderAbstract):
+    """
+    Первая ячейка с совпадением построчно. Как и FirstRowNumFinder, останавливается на первом совпадении,
+    строка и столбец находятся за один проход
+    """
     def get_position(self) -> CellPosition:
+        try:
+            cell = _find_first_cell(df=self._df, value_finder=self.value_finder)
+        except NotImplementedError:
+            pass
+        else:
+            return CellPosition() if cell is None else CellPosition(row=cell[0], col=cell[1])
+
         row_num_finder = FirstRowNumFinder(df=self._df)
         row_num_finder.value_finder = self.value_finder
         row_position = row_num_finder.get_position()
@@ -78,6 +243,55 @@ class FirstCellPositionFinder(PositionFinderAbstract):
         return row_position + col_num_finder.get_position()
 
 
+class NthCellPositionFinder(PositionFinderAbstract):
+    """
+    n-я (с 1) ячейка с совпадением построчно, при from_end - n-я с конца.
+    Блоки строк просматриваются от нужного края df, поиск останавливается, как только набралось n совпадений
+    """
+    def __init__(self, df: pd.DataFrame = None, sr: pd.Series = None, n: int = 1, from_end: bool = False):
+        if n < 1:
+            raise Exception('The "n" must be positive')
+        super().__init__(df=df, sr=sr)
+        self._n = n
+        self._from_end = from_end
+
+    @property
+    def n(self) -> int:
+        return self._n
+
+    @property
+    def from_end(self) -> bool:
+        return self._from_end
+
+    def get_position(self) -> CellPosition:
+        try:
+            cell = _find_nth_cell(df=self._df, value_finder=self.value_finder, n=self._n, from_end=self._from_end)
+        except NotImplementedError:
+            # Поисковик без маски: все позиции
+            all_positions_finder = AllCellPositionsFinder(df=self._df)
+            all_positions_finder.value_finder = self.value_finder
+            positions = all_positions_finder.get_all_positions()
+            self.value_finder = self.value_finder
+            if len(positions) < self._n:
+                return CellPosition()
+            return positions[-self._n] if self._from_end else positions[self._n - 1]
+        return CellPosition() if cell is None else CellPosition(row=cell[0], col=cell[1])
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(df, n={self._n}, from_end={self._from_end})'
+
+
+class LastCellPositionFinder(NthCellPositionFinder):
+    """
+    Последняя ячейка с совпадением построчно. Просмотр идёт блоками от конца df, поэтому итоговые строки
+    внизу листа находятся без прохода по всему листу
+    """
+    def __init__(self, df: pd.DataFrame = None, sr: pd.Series = None):
+        super().__init__(df=df, sr=sr, n=1, from_end=True)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(df)'
+
 
 # НЕАКТУАЛЬНО УДАЛИТЬ!!!
 class FirstCellPositionFinderOffset(FirstCellPositionFinder):
@@ -86,3 +300,82 @@ class FirstCellPositionFinderOffset(FirstCellPositionFinder):
             raise Exception('The "cell_offset" is not set')
 
         return super().get_position() + self._cell_offset
+
+
+def _find_first_cell(df: pd.DataFrame, value_finder: ValueFinderAbstract) -> [tuple, None]:
+    """
+    Метки строки и столбца первого построчно совпадения или None (см. _find_nth_cell)
+    """
+    return _find_nth_cell(df=df, value_finder=value_finder, n=1)
+
+
+def _find_nth_cell(df: pd.DataFrame, value_finder: ValueFinderAbstract, n: int, from_end: bool = False,
+                   block_rows: int = FIRST_MATCH_BLOCK_ROWS) -> [tuple, None]:
+    """
+    Метки строки и столбца n-го (с 1) построчно совпадения, при from_end - n-го с конца, или None.
+    Поисковик с индексом (см. ValueFinderAbstract.get_flat_positions) отдаёт отсортированные позиции всего df,
+    индекс строится один раз на df, и n-я позиция берётся из них.
+    Для остальных маска совпадений считается по блокам строк от начала (или от конца) df, начиная с block_rows
+    строк, каждый следующий блок вдвое больше. Поиск останавливается на блоке, в котором набралось n совпадений.
+    Если совпадение зависит от столбца целиком (см. ValueFinderAbstract.cell_wise), то поиск по всему df сразу:
+    строковые поисковики решают, строковый ли столбец, по всем его значениям, а не по блоку.
+    NotImplementedError, если у поисковика нет маски (см. ValueFinderAbstract.get_mask)
+    """
+    rows_cnt, cols_cnt = df.shape
+    finder_df = value_finder.df
+    try:
+        value_finder.df = df
+        positions = value_finder.get_flat_positions()
+        if positions is not None:
+            if len(positions) < n:
+                return None
+            row, col = divmod(int(positions[-n] if from_end else positions[n - 1]), cols_cnt)
+            return df.index.values[row], df.columns.values[col]
+
+        if not value_finder.cell_wise:
+            block_rows = rows_cnt
+        found_cnt = 0
+        for start, end in _iter_blocks(rows_cnt=rows_cnt, block_rows=block_rows, from_end=from_end):
+            value_finder.df = df if start == 0 and end == rows_cnt else df.iloc[start:end]
+            positions = np.flatnonzero(value_finder.get_mask())
+            if found_cnt + len(positions) >= n:
+                position = positions[-(n - found_cnt)] if from_end else positions[n - found_cnt - 1]
+                row, col = divmod(int(position), cols_cnt)
+                return df.index.values[start + row], df.columns.values[col]
+            found_cnt += len(positions)
+    finally:
+        value_finder.df = finder_df
+    return None
+
+
+def _iter_blocks(rows_cnt: int, block_rows: int, from_end: bool) -> Iterable[tuple]:
+    """
+    Границы (start, end) блоков строк от начала или от конца, каждый следующий блок вдвое больше
+    """
+    done_cnt = 0
+    while done_cnt < rows_cnt:
+        size = min(block_rows, rows_cnt - done_cnt)
+        yield (rows_cnt - done_cnt - size, rows_cnt - done_cnt) if from_end else (done_cnt, done_cnt + size)
+        done_cnt += size
+        block_rows *= 2
+
+
+def _apply_actions(coords: np.ndarray, neighbors_container: [NeighborsContainer, None],
+                   cell_offset_action: [CellOffsetAction, None]) -> PositionSet:
+    """
+    Координаты N x 2 -> позиции, у которых есть все соседи, со смещением (если заданы).
+    Все шаги выполняются над массивами целиком
+    """
+    positions = PositionSet.from_coords(_filter_neighbors(coords=coords, neighbors_container=neighbors_container))
+    if cell_offset_action:
+        positions = cell_offset_action.get_position_set(positions=positions)
+    return positions
+
+
+def _filter_neighbors(coords: np.ndarray, neighbors_container: [NeighborsContainer, None]) -> np.ndarray:
+    """
+    Координаты N x 2, у которых есть все соседи. Соседи проверяются сразу для всех координат
+    """
+    if not neighbors_container or not len(coords):
+        return coords
+    return coords[neighbors_container.get_mask(positions=PositionSet.from_coords(coords))]
@@ -1,7 +1,26 @@
+import csv
+import json
+import os
+import posixpath
+import time
+import zipfile
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threading import RLock
+from typing import Dict, Iterator, List, Tuple
+from xml.etree import ElementTree
 
+import numpy as np
 import pandas as pd
 
+from base_types import DataChunk, ExcelCell
+from excel_backends import ExcelBackendAbstract, get_backend, read_only_worksheet, iter_sheet_rows, \
+    convert_excel_cell, rows_to_df
+from executors import AsyncExecutor, get_default_executor
+from grids import TypedGrid, get_grid
+from snapshots import SheetSnapshot, SnapshotUnsupported
+
 
 class DataProviderAbstract(ABC):
     """
@@ -15,12 +34,650 @@ class DataProviderAbstract(ABC):
     def get_df(self) -> pd.DataFrame:
         raise NotImplementedError
 
+    def iter_chunks(self, *args, **kwargs) -> Iterator[DataChunk]:
+        """
+        Потоковое чтение блоками строк. Реализуется не всеми провайдерами
+        """
+        raise NotImplementedError
 
-class ExcelDataProvider(DataProviderAbstract):
+    async def aget_df(self, *args, executor: AsyncExecutor = None, **kwargs) -> pd.DataFrame:
+        """
+        get_df для asyncio кода: чтение выполняется в пуле потоков executor (по умолчанию общем),
+        цикл событий не блокируется
+        """
+        executor = get_default_executor() if executor is None else executor
+        return await executor.run(self.get_df, *args, **kwargs)
+
+
+class FileIdentity:
+    """
+    Идентичность файла: абсолютный путь + время модификации + размер.
+    Если файл изменился, то изменится и его идентичность.
+    """
     def __init__(self, file_path: str):
+        stat = os.stat(file_path)
+        self._path = os.path.abspath(file_path)
+        self._mtime = stat.st_mtime_ns
+        self._size = stat.st_size
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def key(self) -> tuple:
+        return self._path, self._mtime, self._size
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'FileIdentity("{self._path}", mtime={self._mtime}, size={self._size})'
+
+
+class WorkbookCache:
+    """
+    LRU кэш распарсенных листов. Ключ - идентичность файла и имя листа.
+    Если суммарный размер df превышает max_bytes, то вытесняются давно не использованные листы.
+    Один экземпляр можно передавать в несколько провайдеров.
+    """
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+        self._bytes_held = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def bytes_held(self) -> int:
+        return self._bytes_held
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, identity: FileIdentity, sheet_name) -> [pd.DataFrame, None]:
+        with self._lock:
+            self._invalidate_stale(identity=identity)
+            key = (identity.key, sheet_name)
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._hits += 1
+                res = self._items[key][0]
+            else:
+                self._misses += 1
+                res = None
+        return res
+
+    def put(self, identity: FileIdentity, sheet_name, df: pd.DataFrame):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            self._invalidate_stale(identity=identity)
+            key = (identity.key, sheet_name)
+            if key in self._items:
+                self._remove(key)
+            if size > self._max_bytes:
+                # Лист больше всего бюджета, кэшировать его бессмысленно
+                return
+            self._items[key] = (df, size)
+            self._bytes_held += size
+            while self._bytes_held > self._max_bytes:
+                self._remove(next(iter(self._items)))
+
+    def invalidate(self, file_path: str = None):
+        """
+        Сбросить кэш полностью или только для одного файла
+        """
+        with self._lock:
+            if file_path is None:
+                self._items.clear()
+                self._bytes_held = 0
+            else:
+                path = os.path.abspath(file_path)
+                for key in [key for key in self._items if key[0][0] == path]:
+                    self._remove(key)
+
+    def _invalidate_stale(self, identity: FileIdentity):
+        # Файл по тому же пути изменился - старые листы больше не актуальны
+        stale_keys = [key for key in self._items if key[0][0] == identity.path and key[0] != identity.key]
+        for key in stale_keys:
+            self._remove(key)
+
+    def _remove(self, key):
+        _, size = self._items.pop(key)
+        self._bytes_held -= size
+
+    def __repr__(self):
+        return f'WorkbookCache(items={len(self._items)}, bytes_held={self._bytes_held}, hits={self._hits}, ' \
+               f'misses={self._misses})'
+
+
+class LoadStats:
+    """
+    Статистика загрузки листов провайдером:
+    cold - парсинг исходного файла, warm - чтение снимка, cache - кэш в памяти.
+    """
+    SOURCES = ('cold', 'warm', 'cache')
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.SOURCES, 0)
+        self._seconds = dict.fromkeys(self.SOURCES, 0.0)
+        self._last = None
+
+    def add(self, source: str, seconds: float):
+        self._counts[source] += 1
+        self._seconds[source] += seconds
+        self._last = (source, seconds)
+
+    def count(self, source: str) -> int:
+        return self._counts[source]
+
+    def seconds(self, source: str) -> float:
+        return self._seconds[source]
+
+    def mean_seconds(self, source: str) -> [float, None]:
+        return self._seconds[source] / self._counts[source] if self._counts[source] else None
+
+    @property
+    def last(self) -> [tuple, None]:
+        """
+        (источник, секунды) последней загрузки
+        """
+        return self._last
+
+    def __repr__(self):
+        items = ', '.join(f'{source}={self._counts[source]}/{self._seconds[source]:.3f}s' for source in self.SOURCES)
+        return f'LoadStats({items})'
+
+
+class ExcelDataProvider(DataProviderAbstract):
+    """
+    Если передан cache, то каждый лист парсится один раз, пока файл не изменится.
+    Возвращаемый из кэша df общий для всех вызовов, его нельзя изменять inplace.
+    Если передан snapshot_dir, то распарсенный лист сохраняется туда в виде снимка (см. SheetSnapshot),
+    и пока исходный файл не изменится, лист читается из снимка без парсинга xlsx.
+    backend - имя парсера (см. excel_backends.BACKENDS) или 'auto' для самого быстрого из установленных.
+    """
+    def __init__(self, file_path: str, cache: WorkbookCache = None, snapshot_dir: str = None,
+                 backend: [str, ExcelBackendAbstract] = 'pandas'):
         self._file_path = file_path
+        self._cache = cache
+        self._snapshot_dir = snapshot_dir
+        self._backend = backend if isinstance(backend, ExcelBackendAbstract) else get_backend(name=backend)
+        self._load_stats = LoadStats()
+        self._sheets_paths = None
+
+    @property
+    def cache(self) -> WorkbookCache:
+        return self._cache
+
+    @property
+    def backend(self) -> ExcelBackendAbstract:
+        return self._backend
+
+    @property
+    def load_stats(self) -> LoadStats:
+        return self._load_stats
 
     def get_df(self, sheet_name: str) -> pd.DataFrame:
-        with open(self._file_path, 'rb') as xls:
-            self._df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-        return self._df
\ No newline at end of file
+        started = time.perf_counter()
+        identity = None
+        if self._cache is not None or self._snapshot_dir is not None:
+            identity = FileIdentity(self._file_path)
+
+        df = None
+        source = 'cold'
+        if self._cache is not None:
+            df = self._cache.get(identity=identity, sheet_name=sheet_name)
+            if df is not None:
+                source = 'cache'
+
+        if df is None:
+            snapshot = None
+            if self._snapshot_dir is not None:
+                snapshot_dir = SheetSnapshot.get_dir(self._snapshot_dir, self._file_path, sheet_name)
+                snapshot = SheetSnapshot(snapshot_dir=snapshot_dir, source_key=identity.key)
+                if snapshot.exists():
+                    df = snapshot.read()
+                    source = 'warm'
+
+            if df is None:
+                df = self._read_sheet(sheet_name=sheet_name)
+                if snapshot is not None:
+                    try:
+                        snapshot.write(df)
+                    except (SnapshotUnsupported, OSError):
+                        # Снимок - только ускорение, без него лист всё равно прочитан
+                        pass
+
+            if self._cache is not None:
+                self._cache.put(identity=identity, sheet_name=sheet_name, df=df)
+
+        self._df = df
+        self._load_stats.add(source=source, seconds=time.perf_counter() - started)
+        return self._df
+
+    def get_grid(self, sheet_name: [str, int]) -> TypedGrid:
+        """
+        Типизированная сетка листа (см. TypedGrid). Её же используют поисковики с use_index=True по этому df
+        """
+        return get_grid(self.get_df(sheet_name=sheet_name))
+
+    def sheet_names(self) -> List[str]:
+        """
+        Имена листов в порядке книги. Ячейки не читаются
+        """
+        return list(self._get_sheets_paths())
+
+    def dimensions(self, sheet_name: [str, int]) -> [Tuple[ExcelCell, ExcelCell], None]:
+        """
+        Используемый диапазон листа из <dimension> (левая верхняя и правая нижняя ячейки).
+        Читается только начало xml листа. Если диапазон в файле не записан, то None.
+        """
+        sheets_paths = self._get_sheets_paths()
+        if isinstance(sheet_name, int):
+            sheet_name = list(sheets_paths)[sheet_name]
+        if sheet_name not in sheets_paths:
+            raise Exception(f'Worksheet "{sheet_name}" does not exist')
+
+        ref = None
+        with zipfile.ZipFile(self._file_path) as xlsx:
+            with xlsx.open(sheets_paths[sheet_name]) as sheet_xml:
+                for _, element in ElementTree.iterparse(sheet_xml, events=('start',)):
+                    tag = _xml_local_name(element.tag)
+                    if tag == 'dimension':
+                        ref = element.get('ref')
+                        break
+                    if tag == 'sheetData':
+                        # <dimension> всегда раньше данных, дальше искать бессмысленно
+                        break
+
+        res = None
+        if ref:
+            cells = ref.replace('$', '').split(':')
+            res = ExcelCell(cell_name=cells[0]), ExcelCell(cell_name=cells[-1])
+        return res
+
+    def describe(self) -> Dict[str, Tuple[ExcelCell, ExcelCell]]:
+        """
+        Имя листа -> используемый диапазон, см. dimensions
+        """
+        return {sheet_name: self.dimensions(sheet_name) for sheet_name in self.sheet_names()}
+
+    def _get_sheets_paths(self) -> OrderedDict:
+        """
+        Имя листа -> путь xml листа внутри xlsx архива. Читаются только workbook.xml и его связи
+        """
+        identity = FileIdentity(self._file_path)
+        if self._sheets_paths is not None and self._sheets_paths[0] == identity:
+            return self._sheets_paths[1]
+
+        if not zipfile.is_zipfile(self._file_path):
+            raise Exception('Metadata can be read only from xlsx/xlsm files')
+
+        with zipfile.ZipFile(self._file_path) as xlsx:
+            targets = {}
+            with xlsx.open('xl/_rels/workbook.xml.rels') as rels_xml:
+                for element in ElementTree.parse(rels_xml).getroot():
+                    target = element.get('Target')
+                    if target.startswith('/'):
+                        target = target.lstrip('/')
+                    else:
+                        target = posixpath.normpath(posixpath.join('xl', target))
+                    targets[element.get('Id')] = target
+
+            sheets_paths = OrderedDict()
+            with xlsx.open('xl/workbook.xml') as workbook_xml:
+                for element in ElementTree.parse(workbook_xml).getroot().iter():
+                    if _xml_local_name(element.tag) != 'sheet':
+                        continue
+                    rel_id = [value for key, value in element.attrib.items() if _xml_local_name(key) == 'id'][0]
+                    sheets_paths[element.get('name')] = targets[rel_id]
+
+        self._sheets_paths = (identity, sheets_paths)
+        return sheets_paths
+
+    def iter_chunks(self, sheet_name: [str, int], rows_per_chunk: int = 10000) -> Iterator[DataChunk]:
+        """
+        Читает лист построчно (openpyxl read-only) и отдаёт блоки не более rows_per_chunk строк.
+        Значения приводятся так же, как в pd.read_excel: целые float -> int, пустые -> NaN.
+        Пустые строки в конце листа отбрасываются.
+        """
+        if rows_per_chunk < 1:
+            raise Exception('The "rows_per_chunk" must be positive')
+
+        with read_only_worksheet(file_path=self._file_path, sheet_name=sheet_name) as sheet:
+            rows = []
+            row_offset = 0
+            for values in iter_sheet_rows(sheet):
+                rows.append(values)
+                if len(rows) == rows_per_chunk:
+                    yield DataChunk(df=rows_to_df(rows), row_offset=row_offset)
+                    row_offset += rows_per_chunk
+                    rows = []
+            if rows:
+                yield DataChunk(df=rows_to_df(rows), row_offset=row_offset)
+
+    def get_df_ltrb(self, sheet_name: [str, int], start_position: ExcelCell, end_position: ExcelCell) -> pd.DataFrame:
+        """
+        Читает только прямоугольник листа от start_position до end_position включительно.
+        Индекс и столбцы результата - zero-based номера строк и столбцов листа.
+        Если лист уже есть в кэше, то прямоугольник вырезается из него.
+        Иначе ячейки читаются построчно, чтение прекращается на последней строке прямоугольника.
+        Прямоугольник обрезается по фактическим данным листа, а не по размерам, записанным в файле.
+        """
+        if not isinstance(start_position, ExcelCell) or not isinstance(end_position, ExcelCell):
+            raise Exception('The start and the end positions must be instance of ExcelCell')
+
+        start = start_position.cell_position
+        end = end_position.cell_position
+        if not start <= end:
+            return pd.DataFrame()
+
+        cached_df = None
+        if self._cache is not None:
+            cached_df = self._cache.get(identity=FileIdentity(self._file_path), sheet_name=sheet_name)
+
+        if cached_df is not None:
+            res_df = cached_df.iloc[start.row:end.row + 1, start.col:end.col + 1]
+            res_df.index = range(start.row, start.row + res_df.shape[0])
+            res_df.columns = range(start.col, start.col + res_df.shape[1])
+        else:
+            res_df = self._read_ltrb(sheet_name=sheet_name, start=start, end=end)
+        return res_df
+
+    def _read_ltrb(self, sheet_name: [str, int], start, end) -> pd.DataFrame:
+        with read_only_worksheet(file_path=self._file_path, sheet_name=sheet_name) as sheet:
+            # Размер листа из тега <dimension> может быть занижен, поэтому ширина из него - только нижняя оценка,
+            # а строки читаются по фактическим данным
+            declared_cols_cnt = max((sheet.max_column or 0) - start.col, 0)
+            sheet.reset_dimensions()
+
+            # openpyxl нумерует строки и столбцы с 1. Читается одна лишняя строка: по ней видно, есть ли строки
+            # после прямоугольника
+            rows = []
+            more_rows = False
+            cells_rows = sheet.iter_rows(min_row=start.row + 1, max_row=end.row + 2,
+                                         min_col=start.col + 1, max_col=end.col + 1)
+            for row in cells_rows:
+                if len(rows) > end.row - start.row:
+                    more_rows = True
+                    break
+                rows.append([convert_excel_cell(cell) for cell in row])
+
+        if not more_rows:
+            # Прямоугольник дошёл до конца листа: пустые строки в конце отбрасываются, как в pd.read_excel
+            while rows and all(value is np.nan for value in rows[-1]):
+                rows.pop()
+        # Пустые столбцы за последним заполненным не входят в лист, как в pd.read_excel
+        cols_cnt = declared_cols_cnt
+        for row in rows:
+            filled = [col_num for col_num, value in enumerate(row) if value is not np.nan]
+            if filled:
+                cols_cnt = max(cols_cnt, filled[-1] + 1)
+        cols_cnt = min(cols_cnt, end.col - start.col + 1)
+
+        if rows and cols_cnt:
+            res_df = rows_to_df([row[:cols_cnt] for row in rows])
+            res_df.index = range(start.row, start.row + res_df.shape[0])
+            res_df.columns = range(start.col, start.col + res_df.shape[1])
+        else:
+            res_df = pd.DataFrame(columns=range(start.col, start.col + cols_cnt))
+        return res_df
+
+    def _read_sheet(self, sheet_name: str) -> pd.DataFrame:
+        return self._backend.read_sheet(file_path=self._file_path, sheet_name=sheet_name)
+
+
+class CSVDataProvider(DataProviderAbstract):
+    """
+    Текстовая выгрузка с разделителем. Файл читается как сетка без заголовка (header=None), как лист Excel:
+    - пустое поле - пустая ячейка (NaN), как '' в CellValue;
+    - поле, записанное числом, становится числом, как при открытии файла в Excel: целые -> int, прочие -> float;
+    - остальные поля остаются строками;
+    - пустые строки внутри файла сохраняются, чтобы не сдвигать номера строк, в конце - отбрасываются.
+    Строки могут быть разной длины, короткие дополняются NaN.
+    Если передан cache, то файл парсится один раз, пока не изменится.
+    """
+    sep = ','
+
+    def __init__(self, file_path: str, sep: str = None, encoding: str = 'utf-8', cache: WorkbookCache = None):
+        self._file_path = file_path
+        self._sep = self.sep if sep is None else sep
+        self._encoding = encoding
+        self._cache = cache
+        self._width = None
+
+    @property
+    def cache(self) -> WorkbookCache:
+        return self._cache
+
+    def get_df(self) -> pd.DataFrame:
+        identity = None
+        df = None
+        if self._cache is not None:
+            identity = FileIdentity(self._file_path)
+            df = self._cache.get(identity=identity, sheet_name=None)
+
+        if df is None:
+            try:
+                try:
+                    df = self._read_csv()
+                except pd.errors.ParserError:
+                    # Есть строки длиннее первой: C парсер берёт число столбцов из первой строки
+                    df = self._read_csv(names=range(self._get_width()))
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame()
+            # Пустые строки в конце отбрасываются, как в pd.read_excel
+            filled_rows = np.flatnonzero(df.notna().any(axis=1).to_numpy())
+            df = _convert_text_df(df.iloc[:filled_rows[-1] + 1 if len(filled_rows) else 0])
+            if self._cache is not None:
+                self._cache.put(identity=identity, sheet_name=None, df=df)
+
+        self._df = df
+        return self._df
+
+    def iter_chunks(self, rows_per_chunk: int = 10000) -> Iterator[DataChunk]:
+        """
+        Читает файл блоками не более rows_per_chunk строк, не загружая его целиком.
+        Значения приводятся так же, как в get_df, но по каждому блоку отдельно.
+        Пустые строки в конце файла не отбрасываются.
+        """
+        if rows_per_chunk < 1:
+            raise Exception('The "rows_per_chunk" must be positive')
+
+        # В блочном режиме C парсер молча обрезает строки длиннее первой, поэтому ширина считается заранее
+        row_offset = 0
+        for chunk_df in self._iter_csv_chunks(rows_per_chunk=rows_per_chunk, names=range(self._get_width())):
+            yield DataChunk(df=chunk_df, row_offset=row_offset)
+            row_offset += chunk_df.shape[0]
+
+    def _iter_csv_chunks(self, rows_per_chunk: int, **kwargs) -> Iterator[pd.DataFrame]:
+        try:
+            with self._read_csv(chunksize=rows_per_chunk, **kwargs) as reader:
+                for chunk_df in reader:
+                    chunk_df.index = pd.RangeIndex(chunk_df.shape[0])
+                    yield _convert_text_df(chunk_df)
+        except pd.errors.EmptyDataError:
+            return
+
+    def _read_csv(self, **kwargs):
+        # Всё читается строками: числа распознаются в _convert_text_df по правилам Excel, а не pandas
+        return pd.read_csv(self._file_path, sep=self._sep, encoding=self._encoding, header=None, dtype=str,
+                           keep_default_na=False, na_values=[''], skip_blank_lines=False, **kwargs)
+
+    def _get_width(self) -> int:
+        """
+        Число полей в самой длинной строке файла
+        """
+        if self._width is None:
+            with open(self._file_path, encoding=self._encoding, newline='') as csv_file:
+                self._width = max((len(row) for row in csv.reader(csv_file, delimiter=self._sep)), default=0)
+        return self._width
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}("{self._file_path}")'
+
+
+class TSVDataProvider(CSVDataProvider):
+    """
+    Текстовая выгрузка с табуляцией в качестве разделителя
+    """
+    sep = '\t'
+
+
+class JSONGridDataProvider(DataProviderAbstract):
+    """
+    JSON файл со списком строк, каждая строка - список значений ячеек: [["SKU", 1, 2.5], [null, "", 3]].
+    null и '' - пустые ячейки (NaN), целые float -> int, как в pd.read_excel. Короткие строки дополняются NaN.
+    """
+    def __init__(self, file_path: str, encoding: str = 'utf-8'):
+        self._file_path = file_path
+        self._encoding = encoding
+
+    def get_df(self) -> pd.DataFrame:
+        with open(self._file_path, encoding=self._encoding) as json_file:
+            rows = json.load(json_file)
+        if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+            raise Exception('JSON grid must be a list of rows, each row must be a list of cells values')
+
+        rows = [[_convert_json_cell(value) for value in row] for row in rows]
+        self._df = rows_to_df(rows) if any(rows) else pd.DataFrame()
+        return self._df
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}("{self._file_path}")'
+
+
+class BatchResult:
+    """
+    Результат загрузки одного листа в пакете. Если загрузка упала, то df = None, а в error исключение.
+    """
+    def __init__(self, file_path: str, sheet_name: [str, int], df: pd.DataFrame = None, error: Exception = None):
+        self._file_path = file_path
+        self._sheet_name = sheet_name
+        self._df = df
+        self._error = error
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    @property
+    def sheet_name(self) -> [str, int]:
+        return self._sheet_name
+
+    @property
+    def df(self) -> [pd.DataFrame, None]:
+        return self._df
+
+    @property
+    def error(self) -> [Exception, None]:
+        return self._error
+
+    def __bool__(self):
+        return self._error is None
+
+    def __repr__(self):
+        status = 'ok' if self._error is None else f'error={self._error!r}'
+        return f'BatchResult("{self._file_path}", "{self._sheet_name}", {status})'
+
+
+class ExcelBatchDataProvider:
+    """
+    Загрузка многих листов (пар файл + лист) в пуле процессов: парсинг xlsx упирается в CPU и GIL.
+    Результаты отдаются по мере готовности, а не в порядке items.
+    Ошибка одного файла не прерывает пакет, а попадает в BatchResult.error.
+    """
+    def __init__(self, items: List[Tuple[str, [str, int]]], max_workers: int = None, snapshot_dir: str = None,
+                 backend: str = 'pandas'):
+        self._items = list(items)
+        self._max_workers = max_workers
+        self._snapshot_dir = snapshot_dir
+        self._backend = backend
+
+    def iter_results(self) -> Iterator[BatchResult]:
+        executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        try:
+            futures = {
+                executor.submit(_load_excel_sheet, file_path, sheet_name, self._snapshot_dir, self._backend):
+                    (file_path, sheet_name)
+                for file_path, sheet_name in self._items
+            }
+            for future in as_completed(futures):
+                file_path, sheet_name = futures[future]
+                try:
+                    df = future.result()
+                except Exception as error:
+                    yield BatchResult(file_path=file_path, sheet_name=sheet_name, error=error)
+                else:
+                    yield BatchResult(file_path=file_path, sheet_name=sheet_name, df=df)
+        finally:
+            # Если перебор прервали, то ещё не начатые загрузки отменяются
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(items={len(self._items)}, max_workers={self._max_workers})'
+
+
+def _load_excel_sheet(file_path: str, sheet_name: [str, int], snapshot_dir: [str, None], backend: str) -> pd.DataFrame:
+    """
+    Выполняется в дочернем процессе ExcelBatchDataProvider
+    """
+    provider = ExcelDataProvider(file_path=file_path, snapshot_dir=snapshot_dir, backend=backend)
+    return provider.get_df(sheet_name=sheet_name)
+
+
+def _xml_local_name(name: str) -> str:
+    # Пространства имён в обычном и strict OOXML отличаются, поэтому сравниваются только локальные имена
+    return name.rsplit('}', 1)[-1]
+
+
+def _convert_text_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Поля, записанные конечными числами, становятся числами. Столбец только из чисел получает числовой dtype,
+    как в pd.read_excel: int64, если все значения целые и пропусков нет, иначе float64.
+    """
+    columns = {}
+    for label in df.columns:
+        values = df[label].to_numpy(dtype=object)
+        numbers = pd.to_numeric(df[label], errors='coerce').to_numpy(dtype=np.float64)
+        # 'inf', 'nan' и т.п. Excel числами не считает
+        numbers_mask = np.isfinite(numbers)
+        empty_mask = pd.isna(values)
+        if numbers_mask.all():
+            is_int = (numbers == np.trunc(numbers)).all() and (np.abs(numbers) < 2 ** 63).all()
+            res = numbers.astype(np.int64) if is_int else numbers
+        elif (numbers_mask | empty_mask).all():
+            res = numbers
+        else:
+            res = values.copy()
+            if numbers_mask.any():
+                res[numbers_mask] = [_convert_json_cell(number) for number in numbers[numbers_mask].tolist()]
+        columns[label] = res
+    return pd.DataFrame(columns, index=df.index, columns=df.columns)
+
+
+def _convert_json_cell(value):
+    if value is None or (isinstance(value, str) and value == ''):
+        res = np.nan
+    elif isinstance(value, float) and value.is_integer():
+        res = int(value)
+    else:
+        res = value
+    return res
@@ -0,0 +1,229 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class SnapshotUnsupported(Exception):
+    """
+    df нельзя сохранить в снимок (нестандартный индекс, неизвестный тип значения и т.п.)
+    """
+
+
+class SheetSnapshot:
+    """
+    Колоночный бинарный снимок листа в каталоге: по .npy файлу на массив + meta.json.
+    Числовые столбцы сохраняются как есть и при чтении отображаются в память (mmap, copy-on-write).
+    Object столбцы раскладываются на типы значений, числа, целые и коды строк.
+    Строки хранятся один раз: utf-8 блоб + смещения.
+    Снимок считается актуальным, пока не изменилась идентичность исходного файла.
+    """
+    VERSION = 1
+    META_FILE = 'meta.json'
+
+    # Типы значений в object столбцах
+    KIND_EMPTY = 0
+    KIND_INT = 1
+    KIND_FLOAT = 2
+    KIND_STR = 3
+    KIND_BOOL = 4
+    KIND_DATETIME = 5
+    KIND_TIMESTAMP = 6
+    KIND_TIME = 7
+    KIND_TIMEDELTA = 8
+
+    def __init__(self, snapshot_dir: str, source_key: tuple):
+        """
+        :param snapshot_dir: каталог снимка одного листа
+        :param source_key: идентичность исходного файла (FileIdentity.key)
+        """
+        self._snapshot_dir = snapshot_dir
+        self._source_key = list(source_key)
+
+    @staticmethod
+    def get_dir(cache_dir: str, file_path: str, sheet_name) -> str:
+        name = f'{os.path.abspath(file_path)}|{type(sheet_name).__name__}|{sheet_name}'
+        return os.path.join(cache_dir, hashlib.sha1(name.encode('utf-8')).hexdigest())
+
+    def exists(self) -> bool:
+        meta = self._read_meta()
+        return meta is not None and meta['version'] == self.VERSION and meta['source'] == self._source_key
+
+    def read(self) -> pd.DataFrame:
+        meta = self._read_meta()
+        strings = None
+        columns = {}
+        for col_num, col_meta in enumerate(meta['columns']):
+            if col_meta['encoding'] == 'numpy':
+                values = self._load(f'{col_num}')
+            else:
+                if strings is None:
+                    strings = self._read_strings()
+                values = self._decode_object_column(col_num=col_num, strings=strings)
+            columns[col_meta['label']] = values
+
+        df = pd.DataFrame(columns, index=pd.RangeIndex(meta['rows_cnt']), copy=False)
+        for col_meta in meta['columns']:
+            if col_meta['encoding'] == 'object' and col_meta['dtype'] != 'object':
+                df[col_meta['label']] = df[col_meta['label']].astype(col_meta['dtype'])
+        return df
+
+    def write(self, df: pd.DataFrame):
+        """
+        Сохранить df. Если df нельзя сохранить, то вызывается SnapshotUnsupported, а каталог снимка удаляется.
+        """
+        if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+            raise SnapshotUnsupported('Only the default RangeIndex is supported')
+        if not all(isinstance(label, (int, np.integer)) for label in df.columns):
+            raise SnapshotUnsupported('Only integer column labels are supported')
+
+        if os.path.isdir(self._snapshot_dir):
+            shutil.rmtree(self._snapshot_dir)
+        os.makedirs(self._snapshot_dir)
+        try:
+            strings = {}
+            columns_meta = []
+            for col_num in range(df.shape[1]):
+                seria = df.iloc[:, col_num]
+                if isinstance(seria.dtype, np.dtype) and seria.dtype.kind in 'biufmM':
+                    encoding = 'numpy'
+                    self._save(f'{col_num}', seria.to_numpy())
+                else:
+                    encoding = 'object'
+                    self._encode_object_column(col_num=col_num, values=seria.to_numpy(dtype=object), strings=strings)
+                columns_meta.append({'label': int(df.columns[col_num]), 'dtype': str(seria.dtype),
+                                     'encoding': encoding})
+            self._write_strings(strings=list(strings))
+            meta = {
+                'version': self.VERSION,
+                'source': self._source_key,
+                'rows_cnt': df.shape[0],
+                'columns': columns_meta,
+            }
+            # meta.json пишется последним: снимок без него не считается существующим
+            with open(os.path.join(self._snapshot_dir, self.META_FILE), 'w', encoding='utf-8') as meta_file:
+                json.dump(meta, meta_file)
+        except Exception:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+            raise
+
+    def _encode_object_column(self, col_num: int, values: np.ndarray, strings: dict):
+        rows_cnt = values.shape[0]
+        kinds = np.zeros(rows_cnt, dtype=np.int8)
+        ints = np.zeros(rows_cnt, dtype=np.int64)
+        floats = np.zeros(rows_cnt, dtype=np.float64)
+        for row_num, value in enumerate(values):
+            # Порядок проверок важен: bool - подкласс int, Timestamp - подкласс datetime
+            if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+                kind = self.KIND_EMPTY
+            elif isinstance(value, str):
+                kind = self.KIND_STR
+                ints[row_num] = strings.setdefault(value, len(strings))
+            elif isinstance(value, (bool, np.bool_)):
+                kind = self.KIND_BOOL
+                ints[row_num] = int(value)
+            elif isinstance(value, (int, np.integer)):
+                if not np.iinfo(np.int64).min <= value <= np.iinfo(np.int64).max:
+                    raise SnapshotUnsupported(f'Integer is out of int64 range: {value}')
+                kind = self.KIND_INT
+                ints[row_num] = value
+            elif isinstance(value, (float, np.floating)):
+                kind = self.KIND_FLOAT
+                floats[row_num] = value
+            elif isinstance(value, pd.Timestamp):
+                kind = self.KIND_TIMESTAMP
+                ints[row_num] = value.value
+            elif isinstance(value, datetime.datetime):
+                kind = self.KIND_DATETIME
+                try:
+                    ints[row_num] = pd.Timestamp(value).value
+                except (OverflowError, ValueError):
+                    raise SnapshotUnsupported(f'Datetime is out of range: {value}')
+            elif isinstance(value, datetime.time):
+                kind = self.KIND_TIME
+                ints[row_num] = ((value.hour * 60 + value.minute) * 60 + value.second) * 10 ** 6 + value.microsecond
+            elif isinstance(value, datetime.timedelta):
+                kind = self.KIND_TIMEDELTA
+                try:
+                    ints[row_num] = pd.Timedelta(value).value
+                except (OverflowError, ValueError):
+                    raise SnapshotUnsupported(f'Timedelta is out of range: {value}')
+            else:
+                raise SnapshotUnsupported(f'Unsupported value type: {type(value).__name__}')
+            kinds[row_num] = kind
+
+        self._save(f'{col_num}_kinds', kinds)
+        self._save(f'{col_num}_ints', ints)
+        self._save(f'{col_num}_floats', floats)
+
+    def _decode_object_column(self, col_num: int, strings: list) -> np.ndarray:
+        kinds = self._load(f'{col_num}_kinds')
+        ints = self._load(f'{col_num}_ints')
+        floats = self._load(f'{col_num}_floats')
+
+        values = np.empty(kinds.shape[0], dtype=object)
+        values[:] = np.nan
+        # .tolist() отдаёт значения питоновскими int/float, как в df после pd.read_excel
+        mask = kinds == self.KIND_INT
+        values[mask] = ints[mask].tolist()
+        mask = kinds == self.KIND_FLOAT
+        values[mask] = floats[mask].tolist()
+        mask = kinds == self.KIND_BOOL
+        values[mask] = ints[mask].astype(bool).tolist()
+        mask = kinds == self.KIND_STR
+        values[mask] = [strings[code] for code in ints[mask]]
+        for row_num in np.flatnonzero(kinds >= self.KIND_DATETIME):
+            kind = kinds[row_num]
+            if kind == self.KIND_TIMESTAMP:
+                values[row_num] = pd.Timestamp(int(ints[row_num]))
+            elif kind == self.KIND_DATETIME:
+                values[row_num] = pd.Timestamp(int(ints[row_num])).to_pydatetime()
+            elif kind == self.KIND_TIME:
+                seconds, microsecond = divmod(int(ints[row_num]), 10 ** 6)
+                minutes, second = divmod(seconds, 60)
+                hour, minute = divmod(minutes, 60)
+                values[row_num] = datetime.time(hour, minute, second, microsecond)
+            else:
+                values[row_num] = pd.Timedelta(int(ints[row_num])).to_pytimedelta()
+        return values
+
+    def _write_strings(self, strings: list):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        self._save('strings_blob', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        self._save('strings_offsets', offsets)
+
+    def _read_strings(self) -> list:
+        blob = self._load('strings_blob').tobytes()
+        offsets = self._load('strings_offsets').tolist()
+        return [blob[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def _read_meta(self) -> [dict, None]:
+        meta_path = os.path.join(self._snapshot_dir, self.META_FILE)
+        try:
+            with open(meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            meta = None
+        return meta
+
+    def _save(self, name: str, array: np.ndarray):
+        np.save(os.path.join(self._snapshot_dir, f'{name}.npy'), array, allow_pickle=False)
+
+    def _load(self, name: str) -> np.ndarray:
+        path = os.path.join(self._snapshot_dir, f'{name}.npy')
+        try:
+            # Обычный ndarray поверх отображённой памяти: pandas не должен видеть подкласс memmap
+            array = np.load(path, mmap_mode='c', allow_pickle=False).view(np.ndarray)
+        except ValueError:
+            # Пустой массив отобразить в память нельзя
+            array = np.load(path, allow_pickle=False)
+        return array
+
+    def __repr__(self):
+        return f'SheetSnapshot("{self._snapshot_dir}")'
@@ -1,14 +1,30 @@
+import asyncio
+import datetime
+import os
+import re
+import tempfile
+import time
 import unittest
+import zipfile
 from itertools import zip_longest
 
 import numpy as np
 import pandas as pd
 
 from base_types import ExcelConstants, CellValue, CellPosition, CellOffset, ExcelCell, NeighborCell, \
-    NeighborsContainer, CellOffsetAction, Indexes
-from value_finders import ExactValueFinder, ExactValuesFinder, RegexFinder, StartWithFinder, EndWithFinder
+    NeighborsContainer, CellOffsetAction, Indexes, PositionSet
+from value_finders import ExactValueFinder, ExactValuesFinder, RangeValueFinder, RegexFinder, RegexesFinder, \
+    StartWithFinder, EndWithFinder, ContainsFinder, compile_pattern
 from position_finders import FirstRowNumFinder, FirstColNumFinder, FirstCellPositionFinder, AllRowNumsFinder, \
-    AllCellPositionsFinder, AllColNumsFinder
+    AllCellPositionsFinder, AllColNumsFinder, ChunkedCellPositionsFinder, BatchCellPositionsFinder, \
+    NthCellPositionFinder, LastCellPositionFinder, FIRST_MATCH_BLOCK_ROWS
+from providers import ExcelDataProvider, WorkbookCache, ExcelBatchDataProvider, CSVDataProvider, TSVDataProvider, \
+    JSONGridDataProvider
+from filters import ByExcelCellLTRBFilterDF, ByExcelCellLTRBFilterProvider
+from grids import Normalization, TypedGrid, get_grid, get_string_columns, has_grid, invalidate_grid
+from executors import AsyncExecutor
+from excel_backends import AUTO_BACKEND, benchmark_backends, get_available_backends, get_backend, \
+    get_fastest_backend_name
 from data import simple_data, duplicates_data
 
 
@@ -275,6 +291,40 @@ class TestTDS(unittest.TestCase):
             neighbor = NeighborCell(df=self.simple_df, cell_value=cell_value, cell_offset=cell_offset)
             self.assertEqual(neighbor.is_neighbor(cell_position), result)
 
+    def test_neighbors_mask(self):
+        df = self.duplicates_df
+        positions = PositionSet(rows=np.repeat(np.arange(-1, df.shape[0] + 1), df.shape[1] + 2),
+                                cols=np.tile(np.arange(-1, df.shape[1] + 1), df.shape[0] + 2))
+        neighbors_list = [
+            [NeighborCell(df=df, cell_value=CellValue(), cell_offset=CellOffset(col=0, row=1))],
+            [NeighborCell(df=df, cell_value=CellValue(0), cell_offset=CellOffset(col=1, row=0))],
+            [NeighborCell(df=df, cell_value=CellValue('Общий итог'), cell_offset=CellOffset(col=-2, row=6))],
+            [NeighborCell(df=df, cell_value=CellValue(), cell_offset=CellOffset(col=0, row=1)),
+             NeighborCell(df=df, cell_value=CellValue(''), cell_offset=CellOffset(col=1, row=1))],
+        ]
+        for neighbors in neighbors_list:
+            container = NeighborsContainer(neighbors)
+            expected = [container.is_neighbors_for(position) for position in positions]
+            self.assertEqual(container.get_mask(positions).tolist(), expected)
+
+        # Маска совпадает с is_neighbor и для разнотипных значений
+        for df in [self.simple_df, pd.DataFrame([[0.0, -0.0, 1, 1.0, True], [np.nan, '', None, 'x', 0.1],
+                                                 [2 ** 60, 0, False, 'SKU', 0.30000000000000004]])]:
+            positions = PositionSet(rows=np.repeat(np.arange(df.shape[0]), df.shape[1]),
+                                    cols=np.tile(np.arange(df.shape[1]), df.shape[0]))
+            for value in [0.0, -0.0, 0, 1, 1.0, True, False, np.nan, '', None, 'x', 'SKU', 0.1, 2 ** 60, 4302]:
+                for cell_offset in [CellOffset(col=0, row=0), CellOffset(col=1, row=1), CellOffset(col=-1, row=0)]:
+                    neighbor = NeighborCell(df=df, cell_value=CellValue(value), cell_offset=cell_offset)
+                    expected = [neighbor.is_neighbor(position) for position in positions]
+                    self.assertEqual(neighbor.get_mask(positions).tolist(), expected, msg=repr((value, cell_offset)))
+
+        df = pd.DataFrame([['a', ''], ['b', 'c']])
+        neighbor = NeighborCell(df=df, cell_value=CellValue(), cell_offset=CellOffset(col=1, row=0))
+        positions = PositionSet(rows=[0, 1], cols=[0, 0])
+        self.assertEqual(neighbor.get_mask(positions).tolist(), [True, False])
+        df.iloc[0, 1] = 'filled'
+        self.assertEqual(neighbor.get_mask(positions).tolist(), [False, False])
+
     @unittest.skip
     def test_cell_value(self):
         cell_values_numbers_results = [
@@ -773,6 +823,927 @@ class TestTDS(unittest.TestCase):
             except:
                 print(value)
 
+    def test_workbook_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'simple.xlsx')
+            with pd.ExcelWriter(file_path) as writer:
+                self.simple_df.to_excel(writer, sheet_name='first', header=False, index=False)
+                self.duplicates_df.to_excel(writer, sheet_name='second', header=False, index=False)
+
+            cache = WorkbookCache()
+            provider = ExcelDataProvider(file_path=file_path, cache=cache)
+            first_df = provider.get_df(sheet_name='first')
+            self.assertIs(provider.get_df(sheet_name='first'), first_df)
+            self.assertIs(ExcelDataProvider(file_path=file_path, cache=cache).get_df(sheet_name='first'), first_df)
+            provider.get_df(sheet_name='second')
+            self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 2, 2))
+            self.assertEqual(first_df.shape, self.simple_df.shape)
+            self.assertGreater(cache.bytes_held, 0)
+
+            # Изменение файла сбрасывает все его листы
+            with pd.ExcelWriter(file_path) as writer:
+                self.duplicates_df.to_excel(writer, sheet_name='first', header=False, index=False)
+            os.utime(file_path, ns=(0, 0))
+            self.assertIsNot(provider.get_df(sheet_name='first'), first_df)
+            # Последняя полностью пустая строка в xlsx не попадает
+            self.assertEqual(provider.get_df(sheet_name='first').shape[0], self.duplicates_df.shape[0] - 1)
+            self.assertEqual(len(cache), 1)
+
+            # Бюджет меньше одного листа - ничего не кэшируется
+            small_cache = WorkbookCache(max_bytes=1)
+            ExcelDataProvider(file_path=file_path, cache=small_cache).get_df(sheet_name='first')
+            self.assertEqual((len(small_cache), small_cache.bytes_held), (0, 0))
+
+    def test_chunked_cell_positions_finder(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'simple.xlsx')
+            self.simple_df.to_excel(file_path, sheet_name='first', header=False, index=False)
+            provider = ExcelDataProvider(file_path=file_path)
+            df = provider.get_df(sheet_name='first')
+
+            chunks = list(provider.iter_chunks(sheet_name='first', rows_per_chunk=50))
+            self.assertEqual([chunk.row_offset for chunk in chunks], list(range(0, df.shape[0], 50)))
+            self.assertTrue(all(chunk.df.shape[0] <= 50 for chunk in chunks))
+            self.assertTrue(pd.concat([chunk.df for chunk in chunks], ignore_index=True).equals(df))
+
+            for cell_value in [CellValue('SKU'), CellValue(0), CellValue(105153489.25), CellValue('Qwerty')]:
+                finder = AllCellPositionsFinder(df=df)
+                finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                chunked_finder = ChunkedCellPositionsFinder(
+                    chunks=provider.iter_chunks(sheet_name='first', rows_per_chunk=50)
+                )
+                chunked_finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                self._check_results(expected_result=finder.get_all_positions(),
+                                    finder_result=chunked_finder.get_all_positions())
+                chunked_finder = ChunkedCellPositionsFinder(
+                    chunks=provider.iter_chunks(sheet_name='first', rows_per_chunk=50)
+                )
+                chunked_finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                self.assertEqual(chunked_finder.get_position_set(), finder.get_position_set())
+
+    def test_excel_cell_ltrb_push_down(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'duplicates.xlsx')
+            self.duplicates_df.to_excel(file_path, sheet_name='first', header=False, index=False)
+            df = ExcelDataProvider(file_path=file_path).get_df(sheet_name='first')
+            cells = [('A1', 'G13'), ('B5', 'D7'), ('C2', 'Z100'), ('G12', 'G12'), ('D4', 'B2'), ('A20', 'B30')]
+            for cache in [None, WorkbookCache()]:
+                provider = ExcelDataProvider(file_path=file_path, cache=cache)
+                if cache is not None:
+                    provider.get_df(sheet_name='first')
+                for start_cell, end_cell in cells:
+                    start_position, end_position = ExcelCell(start_cell), ExcelCell(end_cell)
+                    expected_df = ByExcelCellLTRBFilterDF(df=df).res(start_position, end_position)
+                    fact_df = ByExcelCellLTRBFilterProvider(provider=provider, sheet_name='first'). \
+                        res(start_position, end_position)
+                    pd.testing.assert_frame_equal(fact_df, expected_df, check_dtype=False, check_index_type=False,
+                                                  check_column_type=False)
+
+            block_df = ExcelDataProvider(file_path=file_path).get_df_ltrb('first', ExcelCell('B5'), ExcelCell('D7'))
+            self.assertEqual(list(block_df.index), [4, 5, 6])
+            self.assertEqual(list(block_df.columns), [1, 2, 3])
+            self.assertEqual(block_df.loc[5, 2], 2525)
+
+            # Тег <dimension> занижает размер листа
+            understated_path = os.path.join(tmp_dir, 'understated.xlsx')
+            with zipfile.ZipFile(file_path) as source, zipfile.ZipFile(understated_path, 'w') as target:
+                for item in source.infolist():
+                    data = source.read(item.filename)
+                    if item.filename.startswith('xl/worksheets/'):
+                        data, replaced_cnt = re.subn(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1"/>', data)
+                        self.assertEqual(replaced_cnt, 1)
+                    target.writestr(item, data)
+            provider = ExcelDataProvider(file_path=understated_path)
+            self.assertEqual(provider.get_df(sheet_name='first').shape, df.shape)
+            for start_cell, end_cell in cells:
+                start_position, end_position = ExcelCell(start_cell), ExcelCell(end_cell)
+                expected_df = ByExcelCellLTRBFilterDF(df=df).res(start_position, end_position)
+                fact_df = ByExcelCellLTRBFilterProvider(provider=provider, sheet_name='first'). \
+                    res(start_position, end_position)
+                if expected_df.empty:
+                    # Ширину пустого прямоугольника за концом листа по заниженному тегу не узнать
+                    self.assertTrue(fact_df.empty)
+                    continue
+                pd.testing.assert_frame_equal(fact_df, expected_df, check_dtype=False, check_index_type=False,
+                                              check_column_type=False)
+
+    def test_sheet_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'duplicates.xlsx')
+            snapshot_dir = os.path.join(tmp_dir, 'snapshots')
+            df = self.duplicates_df.copy()
+            df[7] = [True, 1.5, datetime.datetime(2020, 1, 2, 3, 4, 5), 'A', None, 0, 2, 3, 4, 5, 6, 7, 8]
+            with pd.ExcelWriter(file_path) as writer:
+                df.to_excel(writer, sheet_name='first', header=False, index=False)
+                self.simple_df.to_excel(writer, sheet_name='second', header=False, index=False)
+
+            cold_provider = ExcelDataProvider(file_path=file_path, snapshot_dir=snapshot_dir)
+            warm_provider = ExcelDataProvider(file_path=file_path, snapshot_dir=snapshot_dir)
+            for sheet_name in ['first', 'second']:
+                cold_df = cold_provider.get_df(sheet_name=sheet_name)
+                warm_df = warm_provider.get_df(sheet_name=sheet_name)
+                pd.testing.assert_frame_equal(warm_df, cold_df)
+                for col in cold_df.columns:
+                    self.assertEqual([type(value) for value in warm_df[col]], [type(value) for value in cold_df[col]])
+            self.assertEqual((cold_provider.load_stats.count('cold'), cold_provider.load_stats.count('warm')), (2, 0))
+            self.assertEqual((warm_provider.load_stats.count('cold'), warm_provider.load_stats.count('warm')), (0, 2))
+            self.assertEqual(warm_provider.load_stats.last[0], 'warm')
+
+            # Изменённый файл парсится заново
+            self.simple_df.to_excel(file_path, sheet_name='first', header=False, index=False)
+            os.utime(file_path, ns=(0, 0))
+            warm_provider.get_df(sheet_name='first')
+            self.assertEqual(warm_provider.load_stats.last[0], 'cold')
+
+    def test_excel_batch_provider(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            items = []
+            for file_num in range(3):
+                file_path = os.path.join(tmp_dir, f'{file_num}.xlsx')
+                self.duplicates_df.to_excel(file_path, sheet_name='first', header=False, index=False)
+                items.append((file_path, 'first'))
+            broken_file_path = os.path.join(tmp_dir, 'broken.xlsx')
+            with open(broken_file_path, 'w') as broken_file:
+                broken_file.write('not a workbook')
+            items += [(broken_file_path, 'first'), (items[0][0], 'absent')]
+
+            results = list(ExcelBatchDataProvider(items=items, max_workers=2).iter_results())
+            self.assertEqual(sorted((result.file_path, result.sheet_name) for result in results), sorted(items))
+            failed = sorted((result.file_path, result.sheet_name) for result in results if not result)
+            self.assertEqual(failed, sorted([(broken_file_path, 'first'), (items[0][0], 'absent')]))
+            expected_df = ExcelDataProvider(file_path=items[0][0]).get_df(sheet_name='first')
+            for result in results:
+                if result:
+                    pd.testing.assert_frame_equal(result.df, expected_df)
+                else:
+                    self.assertIsNone(result.df)
+                    self.assertIsInstance(result.error, Exception)
+
+    def test_workbook_metadata(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'simple.xlsx')
+            with pd.ExcelWriter(file_path) as writer:
+                self.simple_df.to_excel(writer, sheet_name='ПП', header=False, index=False)
+                self.duplicates_df.iloc[:5, :3].to_excel(writer, sheet_name='second', header=False, index=False,
+                                                         startrow=1, startcol=1)
+            provider = ExcelDataProvider(file_path=file_path)
+            self.assertEqual(provider.sheet_names(), ['ПП', 'second'])
+            self.assertEqual(provider.dimensions('ПП'), (ExcelCell('A1'), ExcelCell('G205')))
+            self.assertEqual(provider.dimensions(1), (ExcelCell('B2'), ExcelCell('D6')))
+            self.assertEqual(provider.describe(), {
+                'ПП': (ExcelCell('A1'), ExcelCell('G205')),
+                'second': (ExcelCell('B2'), ExcelCell('D6')),
+            })
+            self.assertRaises(Exception, provider.dimensions, 'absent')
+
+            text_file_path = os.path.join(tmp_dir, 'text.xlsx')
+            with open(text_file_path, 'w') as text_file:
+                text_file.write('not a workbook')
+            self.assertRaises(Exception, ExcelDataProvider(file_path=text_file_path).sheet_names)
+
+    def test_typed_grid(self):
+        df = self.duplicates_df.copy()
+        df[7] = [True, False, 1.0, 2 ** 60, 2 ** 60 + 1, datetime.datetime(2020, 1, 1), np.nan, '', 'SKU', 0.5, None,
+                 -0.0, 'Общий итог']
+        df[8] = np.arange(df.shape[0], dtype=np.int64) * 1099
+        df[9] = np.arange(df.shape[0]) > 5
+        grid = get_grid(df)
+        self.assertIs(get_grid(df), grid)
+        self.assertEqual(grid.shape, df.shape)
+        self.assertEqual(grid.kinds[0, 0], TypedGrid.STRING)
+        self.assertEqual(grid.kinds[0, 7], TypedGrid.BOOL)
+        self.assertEqual(grid.kinds[3, 7], TypedGrid.OTHER)
+        self.assertEqual(grid.kinds[1, 6], TypedGrid.EMPTY)
+        self.assertEqual(grid.strings[grid.codes[0, 0]], 'SKU')
+
+        values = ['SKU', 'Общий итог', 'Qwerty', 0, 1, 1.0, True, False, 1099, 4302.0, 0.5, 2 ** 60, 2 ** 60 + 1,
+                  datetime.datetime(2020, 1, 1), np.int64(2256), np.float64(105153489.25), np.nan, -999]
+        for value in values:
+            np.testing.assert_array_equal(grid.eq_mask(value), df.eq(value).to_numpy(), err_msg=repr(value))
+        np.testing.assert_array_equal(grid.empty, df.replace(to_replace={'': None}).isnull().to_numpy())
+        np.testing.assert_array_equal(grid.isin_mask([3143, 'SKU']), df.isin([3143, 'SKU']).to_numpy())
+
+        # Поисковики с use_index берут маску из плоскостей сетки, индекс значений для этого не строится
+        for cell_value in [CellValue('SKU'), CellValue(0), CellValue(2 ** 60), CellValue(''), CellValue('Qwerty')]:
+            finder = ExactValueFinder(cell_value=cell_value, use_index=True)
+            finder.df = df
+            expected_mask = df.eq(cell_value.value).to_numpy() if cell_value else grid.empty
+            np.testing.assert_array_equal(finder.get_mask(), expected_mask, err_msg=repr(cell_value))
+        finder = ExactValuesFinder(cell_values=[CellValue(3143), CellValue('SKU'), CellValue()], use_index=True)
+        finder.df = df
+        np.testing.assert_array_equal(finder.get_mask(), df.isin([3143, 'SKU']).to_numpy() | grid.empty)
+        self.assertIsNone(grid._value_index)
+
+        # Новый столбец - новая сетка
+        df[10] = 1
+        self.assertIsNot(get_grid(df), grid)
+        self.assertEqual(get_grid(df).shape, df.shape)
+
+    def test_exact_finders_see_inplace_edits(self):
+        df = pd.DataFrame([['a', 1, 'b'], ['c', 2, '']], dtype=object)
+
+        def find(value_finder) -> list:
+            finder = AllCellPositionsFinder(df=df)
+            finder.value_finder = value_finder
+            return finder.get_positions_array().tolist()
+
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue('a'))), [[0, 0]])
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue())), [[1, 2]])
+        df.iloc[0, 0] = 'zz'
+        df.loc[1, 1] = 99
+        df.iloc[1, 2] = 'x'
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue('a'))), [])
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue('zz'))), [[0, 0]])
+        self.assertEqual(find(ExactValuesFinder(cell_values=[CellValue(99), CellValue(2)])), [[1, 1]])
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue())), [])
+
+        # Индекс строится по запросу и после изменений inplace сбрасывается явно
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue('zz'), use_index=True)), [[0, 0]])
+        df.iloc[0, 0] = 'a'
+        invalidate_grid(df)
+        self.assertEqual(find(ExactValueFinder(cell_value=CellValue('a'), use_index=True)), [[0, 0]])
+
+    def test_value_index(self):
+        df = self.duplicates_df.copy()
+        df[7] = [True, False, 1.0, 2 ** 60, 2 ** 60 + 1, datetime.datetime(2020, 1, 1), np.nan, '', 'SKU', 0.5, None,
+                 -0.0, 'Общий итог']
+        grid = get_grid(df)
+        value_index = grid.value_index
+        self.assertIs(get_grid(df).value_index, value_index)
+
+        values = ['SKU', 'Общий итог', 'Qwerty', 0, 1, True, False, 4302.0, 0.5, 2 ** 60, 2 ** 60 + 1,
+                  float(2 ** 60), datetime.datetime(2020, 1, 1), np.int64(2256), -999]
+        for value in values:
+            positions = value_index.lookup(value)
+            np.testing.assert_array_equal(positions, np.flatnonzero(grid.eq_mask(value)), err_msg=repr(value))
+            np.testing.assert_array_equal(value_index.to_coords(positions), np.argwhere(grid.eq_mask(value)))
+        np.testing.assert_array_equal(value_index.empty_positions, np.flatnonzero(grid.empty))
+        np.testing.assert_array_equal(value_index.lookup_many(['SKU', 0, 'Qwerty']),
+                                      np.flatnonzero(grid.isin_mask(['SKU', 0])))
+
+        # Поисковики с индексом и без дают одно и то же
+        for finder_cls in [AllRowNumsFinder, AllColNumsFinder]:
+            for cell_value in [CellValue('SKU'), CellValue(0), CellValue(''), CellValue(2 ** 60), CellValue('Qwerty')]:
+                finder = finder_cls(df=df)
+                finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                index_finder = finder_cls(df=df)
+                index_finder.value_finder = ExactValueFinder(cell_value=cell_value, use_index=True)
+                self._check_results(expected_result=finder.get_all_positions(),
+                                    finder_result=index_finder.get_all_positions())
+
+            cell_values = [CellValue('SKU'), CellValue(None), CellValue(3143)]
+            finder = finder_cls(df=df)
+            finder.value_finder = ExactValuesFinder(cell_values=cell_values)
+            index_finder = finder_cls(df=df)
+            index_finder.value_finder = ExactValuesFinder(cell_values=cell_values, use_index=True)
+            self._check_results(expected_result=finder.get_all_positions(),
+                                finder_result=index_finder.get_all_positions())
+
+        # Все позиции поисковика с индексом берутся из индекса, матрица совпадений не строится
+        value_finders = [ExactValueFinder(cell_value=CellValue('SKU'), use_index=True),
+                         ExactValuesFinder(cell_values=[CellValue('SKU'), CellValue(3143)], use_index=True),
+                         RangeValueFinder(min_value=4000, use_index=True),
+                         StartWithFinder(cell_value=CellValue('Общ'), use_index=True),
+                         ContainsFinder(cell_value=CellValue('итог'), use_index=True)]
+        for value_finder in value_finders:
+            finder = AllCellPositionsFinder(df=df)
+            finder.value_finder = value_finder
+            expected_positions = np.argwhere(value_finder.get_mask())
+            value_finder.get_mask = None
+            np.testing.assert_array_equal(finder.get_positions_array(), expected_positions, err_msg=repr(value_finder))
+
+    def test_positions_array(self):
+        class RowsOnlyFinder(ExactValueFinder):
+            def get_mask(self):
+                raise NotImplementedError
+
+        for cell_value in [CellValue(0), CellValue('Общий итог'), CellValue(''), CellValue('Qwerty')]:
+            finder = AllCellPositionsFinder(df=self.duplicates_df)
+            finder.value_finder = ExactValueFinder(cell_value=cell_value)
+            positions_array = finder.get_positions_array()
+            self.assertEqual(positions_array.shape[1], 2)
+            self.assertEqual([CellPosition(row=row, col=col) for row, col in positions_array],
+                             finder.get_all_positions())
+
+            # Поисковик без маски ищет построчно, результат тот же
+            rows_finder = AllCellPositionsFinder(df=self.duplicates_df)
+            rows_finder.value_finder = RowsOnlyFinder(cell_value=cell_value, use_index=True)
+            np.testing.assert_array_equal(rows_finder.get_positions_array(), positions_array)
+            self._check_results(expected_result=finder.get_all_positions(),
+                                finder_result=rows_finder.get_all_positions())
+
+        finder = AllCellPositionsFinder(df=self.duplicates_df)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue('Общий итог'))
+        finder.cell_offset_action = CellOffsetAction(cell_offset=CellOffset(row=1, col=-1))
+        np.testing.assert_array_equal(finder.get_positions_array(), [[1, 5]])
+
+    def test_position_set(self):
+        finder = AllCellPositionsFinder(df=self.duplicates_df)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue('Общий итог'))
+        position_set = finder.get_position_set()
+        self.assertEqual(position_set.rows.dtype, np.int32)
+        self.assertEqual(len(position_set), 2)
+        self.assertEqual(list(position_set), finder.get_all_positions())
+        self.assertEqual(position_set.excel_cells, [position.excel_cell for position in finder.get_all_positions()])
+        self.assertEqual(position_set[1], CellPosition(row=11, col=0))
+
+        # Смещение и отбрасывание позиций вне df
+        shifted = position_set + CellOffset(row=1, col=-1)
+        self.assertEqual(list(shifted), [position + CellOffset(row=1, col=-1) for position in position_set])
+        self.assertEqual(list(shifted[shifted.in_scope(df=self.duplicates_df)]), [CellPosition(row=1, col=5)])
+
+        other = PositionSet.from_positions([CellPosition(row=11, col=0), CellPosition(row=3, col=2)])
+        self.assertEqual(list(position_set & other), [CellPosition(row=11, col=0)])
+        self.assertEqual(list(position_set | other), [CellPosition(row=0, col=6), CellPosition(row=3, col=2),
+                                                      CellPosition(row=11, col=0)])
+        self.assertEqual(len(PositionSet() | PositionSet()), 0)
+
+    def test_cell_offset_action_position_set(self):
+        df = self.duplicates_df
+        positions = PositionSet(rows=np.repeat(np.arange(df.shape[0]), df.shape[1]),
+                                cols=np.tile(np.arange(df.shape[1]), df.shape[0]))
+        for cell_offset in [CellOffset(row=1, col=-1), CellOffset(row=-3), CellOffset(col=2), CellOffset(row=0, col=0)]:
+            cell_offset_action = CellOffsetAction(cell_offset=cell_offset)
+            cell_offset_action._df = df
+            expected = [cell_offset_action.get_position(position) for position in positions]
+            self.assertEqual(list(cell_offset_action.get_position_set(positions)),
+                             [position for position in expected if position])
+
+        # Якорь -> соседи -> смещение
+        finder = AllCellPositionsFinder(df=df)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue(0))
+        finder.neighbors_container = NeighborsContainer(
+            NeighborCell(df=df, cell_value=CellValue(), cell_offset=CellOffset(col=0, row=1)))
+        finder.cell_offset_action = CellOffsetAction(cell_offset=CellOffset(row=1, col=1))
+        zeros = AllCellPositionsFinder(df=df)
+        zeros.value_finder = ExactValueFinder(cell_value=CellValue(0))
+        expected = [position + CellOffset(row=1, col=1) for position in zeros.get_all_positions()
+                    if finder.neighbors_container.is_neighbors_for(position)]
+        self.assertEqual(finder.get_all_positions(), [position for position in expected if position.in_scope(df)])
+
+    def test_first_match_by_blocks(self):
+        df = pd.DataFrame({0: [f'item {row_num}' for row_num in range(5000)], 1: list(range(5000))}, dtype=object)
+        df.iloc[4000, 1] = 'SKU'
+        df.iloc[4500, 0] = 'SKU'
+        self.assertFalse(has_grid(df))
+        for value_finder_class in [ExactValueFinder, StartWithFinder, ContainsFinder]:
+            finder = FirstCellPositionFinder(df=df)
+            finder.value_finder = value_finder_class(cell_value=CellValue('SKU'))
+            row_finder = FirstRowNumFinder(df=df)
+            row_finder.value_finder = value_finder_class(cell_value=CellValue('SKU'))
+            expected_position = CellPosition(row=4000, col=1) if value_finder_class is ExactValueFinder else \
+                CellPosition(row=4500, col=0)
+            self.assertEqual(finder.get_position(), expected_position)
+            self.assertEqual(row_finder.get_position(), CellPosition(row=expected_position.row))
+            self.assertIs(finder.value_finder.df, df)
+        # Блоки не строят сетку всего df
+        self.assertFalse(has_grid(df))
+
+        finder = FirstCellPositionFinder(df=df)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue('Qwerty'))
+        self.assertFalse(finder.get_position())
+
+        # Построенная сетка не отменяет блоки для поисковика без индекса, а поисковик с индексом
+        # берёт позицию из индекса всего df без масок блоков
+        class BlocksFinder(ExactValueFinder):
+            def get_mask(self):
+                blocks_rows.append(self.df.shape[0])
+                return super().get_mask()
+
+        get_grid(df)
+        for use_index in [False, True]:
+            blocks_rows = []
+            finder.value_finder = BlocksFinder(cell_value=CellValue('item 3'), use_index=use_index)
+            self.assertEqual(finder.get_position(), CellPosition(row=3, col=0))
+            self.assertEqual(blocks_rows, [] if use_index else [FIRST_MATCH_BLOCK_ROWS])
+        self.assertIsNotNone(get_grid(df)._value_index)
+
+        # Смешанный столбец: строковый ли он, решается по всему столбцу, а не по первому блоку
+        mixed_df = pd.DataFrame({0: ['abc'] + ['x'] * 1500 + [5] + ['y'] * 1000}, dtype=object)
+        all_finder = AllCellPositionsFinder(df=mixed_df)
+        all_finder.value_finder = StartWithFinder(cell_value=CellValue('a'))
+        expected_position = (all_finder.get_all_positions() or [CellPosition()])[0]
+        for _ in range(2):
+            finder = FirstCellPositionFinder(df=mixed_df)
+            finder.value_finder = StartWithFinder(cell_value=CellValue('a'))
+            self.assertEqual(finder.get_position(), expected_position)
+            all_finder.get_all_positions()
+
+    def test_nth_and_last_cell_position_finders(self):
+        class RowsOnlyFinder(ExactValueFinder):
+            def __init__(self, cell_value: CellValue):
+                super().__init__(cell_value=cell_value, use_index=True)
+
+            def get_mask(self):
+                raise NotImplementedError
+
+            def get_flat_positions(self):
+                return None
+
+        df = pd.DataFrame({0: [f'item {row_num}' for row_num in range(5000)], 1: list(range(5000))}, dtype=object)
+        for row_num in [10, 2000, 4990]:
+            df.iloc[row_num, 0] = 'Общий итог'
+        df.iloc[4990, 1] = 'Общий итог'
+        for value_finder_class in [ExactValueFinder, RowsOnlyFinder]:
+            all_finder = AllCellPositionsFinder(df=df)
+            all_finder.value_finder = value_finder_class(cell_value=CellValue('Общий итог'))
+            all_positions = all_finder.get_all_positions()
+            self.assertEqual(len(all_positions), 4)
+
+            finder = LastCellPositionFinder(df=df)
+            finder.value_finder = value_finder_class(cell_value=CellValue('Общий итог'))
+            self.assertEqual(finder.get_position(), CellPosition(row=4990, col=1))
+            for n in range(1, 6):
+                finder = NthCellPositionFinder(df=df, n=n)
+                finder.value_finder = value_finder_class(cell_value=CellValue('Общий итог'))
+                self.assertEqual(finder.get_position(), all_positions[n - 1] if n <= 4 else CellPosition())
+                finder = NthCellPositionFinder(df=df, n=n, from_end=True)
+                finder.value_finder = value_finder_class(cell_value=CellValue('Общий итог'))
+                self.assertEqual(finder.get_position(), all_positions[-n] if n <= 4 else CellPosition())
+
+        # С построенной сеткой: без индекса поиск с конца по-прежнему идёт блоками от конца df,
+        # с индексом позиции берутся из индекса всего df
+        class BlocksFinder(ExactValueFinder):
+            def get_mask(self):
+                blocks.append((self.df.index[0], self.df.index[-1]))
+                return super().get_mask()
+
+        get_grid(df)
+        for use_index in [False, True]:
+            blocks = []
+            finder = LastCellPositionFinder(df=df)
+            finder.value_finder = BlocksFinder(cell_value=CellValue('Общий итог'), use_index=use_index)
+            self.assertEqual(finder.get_position(), CellPosition(row=4990, col=1))
+            for n in range(1, 6):
+                finder = NthCellPositionFinder(df=df, n=n, from_end=True)
+                finder.value_finder = BlocksFinder(cell_value=CellValue('Общий итог'), use_index=use_index)
+                self.assertEqual(finder.get_position(), all_positions[-n] if n <= 4 else CellPosition())
+            if use_index:
+                self.assertEqual(blocks, [])
+            else:
+                self.assertEqual(blocks[0], (df.shape[0] - FIRST_MATCH_BLOCK_ROWS, df.shape[0] - 1))
+
+        # Смешанный столбец: результат не зависит от того, искали ли по df раньше
+        mixed_df = pd.DataFrame({0: ['abc'] + ['x'] * 1500 + [5] + ['y'] * 1000 + ['abd']}, dtype=object)
+        fresh_positions = []
+        for value_finder_class in [FirstCellPositionFinder, LastCellPositionFinder]:
+            finder = value_finder_class(df=mixed_df)
+            finder.value_finder = StartWithFinder(cell_value=CellValue('ab'))
+            fresh_positions.append(finder.get_position())
+        all_finder = AllCellPositionsFinder(df=mixed_df)
+        all_finder.value_finder = StartWithFinder(cell_value=CellValue('ab'))
+        all_positions = all_finder.get_all_positions()
+        for n in [1, 2]:
+            for from_end in [False, True]:
+                finder = NthCellPositionFinder(df=mixed_df, n=n, from_end=from_end)
+                finder.value_finder = StartWithFinder(cell_value=CellValue('ab'))
+                expected_position = CellPosition()
+                if n <= len(all_positions):
+                    expected_position = all_positions[-n] if from_end else all_positions[n - 1]
+                self.assertEqual(finder.get_position(), expected_position)
+        self.assertEqual(fresh_positions, [(all_positions or [CellPosition()])[0],
+                                           (all_positions or [CellPosition()])[-1]])
+        self.assertRaises(Exception, NthCellPositionFinder, df=df, n=0)
+
+    def test_string_columns_cache(self):
+        df = self.duplicates_df.copy()
+        df[7] = np.arange(df.shape[0])
+        string_columns = get_string_columns(df)
+        self.assertIs(get_string_columns(df), string_columns)
+        # Числовые столбцы не приводятся к строкам
+        self.assertNotIn(7, string_columns.col_nums)
+
+        finders = [(StartWithFinder, 'Общ', 'startswith'), (EndWithFinder, 'итог', 'endswith'),
+                   (RegexFinder, '.*КАНОН.*', 'match')]
+        for finder_cls, value, method in finders:
+            expected_mask = np.zeros(df.shape, dtype=bool)
+            for col_num in string_columns.col_nums:
+                expected_mask[:, col_num] = getattr(df.iloc[:, col_num].astype(str).str, method)(value)
+            finder = AllCellPositionsFinder(df=df)
+            finder.value_finder = finder_cls(cell_value=CellValue(value))
+            np.testing.assert_array_equal(finder.get_positions_array(), np.argwhere(expected_mask))
+
+        # Без use_index кэш не используется, поэтому изменения inplace видны сразу
+        df_edit = pd.DataFrame([['abc', 'x'], ['b', 'y']])
+        for finder_cls, value in [(StartWithFinder, 'a'), (EndWithFinder, 'c'), (ContainsFinder, 'bc'),
+                                  (RegexFinder, 'a.c')]:
+            df_edit.iloc[0, 0] = 'abc'
+            finder = AllCellPositionsFinder(df=df_edit)
+            finder.value_finder = finder_cls(cell_value=CellValue(value))
+            self.assertEqual(finder.get_positions_array().tolist(), [[0, 0]])
+            df_edit.iloc[0, 0] = 'zzz'
+            self.assertEqual(finder.get_positions_array().tolist(), [])
+        self.assertFalse(has_grid(df_edit))
+        finder = AllCellPositionsFinder(df=df_edit)
+        finder.value_finder = RegexFinder(cell_value=CellValue('z+'), use_index=True)
+        self.assertEqual(finder.get_positions_array().tolist(), [[0, 0]])
+        self.assertTrue(has_grid(df_edit))
+
+        df[8] = 'Общий итог'
+        self.assertIsNot(get_string_columns(df), string_columns)
+        self.assertIn(8, get_string_columns(df).col_nums)
+        string_columns = get_string_columns(df)
+        invalidate_grid(df)
+        self.assertIsNot(get_string_columns(df), string_columns)
+
+    def test_affix_index(self):
+        df = self.simple_df.copy()
+        df[7] = ['НЕБИВОЛОЛ-' + str(row_num) if row_num % 3 else np.nan for row_num in range(df.shape[0])]
+        df[7] = df[7].astype('string')
+        values = ['НЕБИВОЛОЛ', 'НЕБИВОЛОЛ-1', 'Общ', 'итог', '№30', '2,5МГ+6,25МГ №30', 'nan', 'Qwerty',
+                  '\U0010ffff']
+        for finder_cls in [StartWithFinder, EndWithFinder]:
+            for position_finder_cls in [AllRowNumsFinder, AllColNumsFinder]:
+                for value in values:
+                    finder = position_finder_cls(df=df)
+                    finder.value_finder = finder_cls(cell_value=CellValue(value))
+                    index_finder = position_finder_cls(df=df)
+                    index_finder.value_finder = finder_cls(cell_value=CellValue(value), use_index=True)
+                    self._check_results(expected_result=finder.get_all_positions(),
+                                        finder_result=index_finder.get_all_positions())
+
+        finder = AllCellPositionsFinder(df=df)
+        finder.value_finder = StartWithFinder(cell_value=CellValue('НЕБИВОЛОЛ-1'), use_index=True)
+        expected_rows = [row_num for row_num in range(df.shape[0]) if row_num % 3 and str(row_num).startswith('1')]
+        self.assertEqual(finder.get_positions_array().tolist(), [[row_num, 7] for row_num in expected_rows])
+
+    def test_regexes_finder(self):
+        patterns = ['.*КАНОН.*\\d{4}.*', '.*АРИТЕЛ ПЛЮС(?!.*2,5).*', 'Общий', 'Qwerty', '.*КАНОН.*\\d{4}.*']
+        regexes_finder = AllCellPositionsFinder(df=self.duplicates_df)
+        regexes_finder.value_finder = RegexesFinder(cell_values=[CellValue(pattern) for pattern in patterns])
+        positions_by_pattern = regexes_finder.value_finder.get_positions_by_pattern()
+        self.assertEqual(list(positions_by_pattern), patterns[:4])
+        self.assertEqual(positions_by_pattern['.*АРИТЕЛ ПЛЮС(?!.*2,5).*'].tolist(), [[2, 0], [7, 0], [10, 0]])
+
+        expected_positions = set()
+        for pattern in patterns[:4]:
+            finder = AllCellPositionsFinder(df=self.duplicates_df)
+            finder.value_finder = RegexFinder(cell_value=CellValue(pattern))
+            np.testing.assert_array_equal(positions_by_pattern[pattern].reshape(-1, 2), finder.get_positions_array())
+            expected_positions |= set(map(tuple, finder.get_positions_array().tolist()))
+        self.assertEqual(regexes_finder.get_positions_array().tolist(), sorted(map(list, expected_positions)))
+
+        sr_finder = AllRowNumsFinder(sr=self.duplicates_df[0])
+        sr_finder.value_finder = RegexesFinder(cell_values=[CellValue(pattern) for pattern in patterns])
+        self.assertEqual(sr_finder.get_all_positions(), [CellPosition(row=row) for row in [2, 5, 7, 10, 11]])
+
+        # Шаблоны компилируются один раз
+        compile_pattern.cache_clear()
+        regexes_finder.value_finder.get_mask()
+        regexes_finder.value_finder.get_mask()
+        self.assertEqual((compile_pattern.cache_info().misses, compile_pattern.cache_info().hits), (4, 4))
+
+    def test_empty_cells(self):
+        df = self.duplicates_df.copy()
+        df[7] = [None, '', np.nan, pd.NaT, 'SKU', 0, 0.0, False, '', None, 1, 'x', '']
+        grid = get_grid(df)
+        expected_empty = df.replace(to_replace={'': None}).isnull().to_numpy()
+        np.testing.assert_array_equal(grid.empty, expected_empty)
+        self.assertIs(grid.empty, grid.empty)
+        self.assertFalse(grid.empty.flags.writeable)
+
+        for col in range(df.shape[1]):
+            finder = AllRowNumsFinder(sr=df[col])
+            finder.value_finder = ExactValueFinder(cell_value=CellValue(''))
+            self.assertEqual([position.row for position in finder.get_position()],
+                             np.flatnonzero(expected_empty[:, col]).tolist())
+
+        neighbor = NeighborCell(df=df, cell_value=CellValue(), cell_offset=CellOffset(row=0, col=1))
+        for row in range(df.shape[0]):
+            for col in range(df.shape[1]):
+                expected = col + 1 < df.shape[1] and expected_empty[row, col + 1]
+                self.assertEqual(neighbor.is_neighbor(CellPosition(row=row, col=col)), expected)
+
+        # Проверка одной ячейки читает df, а не сетку, поэтому видит изменения inplace
+        df.iloc[1, 7] = 'filled'
+        self.assertFalse(neighbor.is_neighbor(CellPosition(row=1, col=6)))
+
+    def test_batch_cell_positions_finder(self):
+        cell_values = [CellValue('SKU'), CellValue(0), CellValue('Общий итог'), CellValue(''), CellValue(4302),
+                       CellValue('Qwerty')]
+        batch_finder = BatchCellPositionsFinder(df=self.duplicates_df, cell_values=cell_values[:-1])
+        neighbors_container = NeighborsContainer(neighbors=NeighborCell(df=self.duplicates_df, cell_value=CellValue(),
+                                                                        cell_offset=CellOffset(col=0, row=-1)))
+        batch_finder.add(cell_value=cell_values[-1], neighbors_container=neighbors_container)
+        self.assertRaises(Exception, batch_finder.add, CellValue(None))
+
+        results = batch_finder.get_all_positions()
+        self.assertEqual(list(results), [(TypedGrid.STRING, 'SKU'), (TypedGrid.NUMBER, 0),
+                                         (TypedGrid.STRING, 'Общий итог'), (TypedGrid.EMPTY, None),
+                                         (TypedGrid.NUMBER, 4302), (TypedGrid.STRING, 'Qwerty')])
+        for cell_value in cell_values:
+            finder = AllCellPositionsFinder(df=self.duplicates_df)
+            finder.value_finder = ExactValueFinder(cell_value=cell_value)
+            if cell_value.value == 'Qwerty':
+                finder.neighbors_container = neighbors_container
+            self._check_results(expected_result=finder.get_all_positions(),
+                                finder_result=results[batch_finder.get_key(cell_value)])
+
+        # Свои соседи и смещение для каждого значения
+        batch_finder = BatchCellPositionsFinder(df=self.duplicates_df)
+        batch_finder.add(cell_value=CellValue(0), neighbors_container=neighbors_container)
+        batch_finder.add(cell_value=CellValue('Общий итог'),
+                         cell_offset_action=CellOffsetAction(cell_offset=CellOffset(row=1, col=-1)))
+        self.assertEqual(batch_finder.get_all_positions(),
+                         {(TypedGrid.NUMBER, 0): [CellPosition(col=5, row=6)],
+                          (TypedGrid.STRING, 'Общий итог'): [CellPosition(col=5, row=1)]})
+
+        # По умолчанию индекс строится на каждый вызов и видит изменения inplace
+        df = pd.DataFrame([['a', 1], ['b', 2]], dtype=object)
+        batch_finder = BatchCellPositionsFinder(df=df, cell_values=[CellValue('a'), CellValue('zz')])
+        self.assertEqual(batch_finder.get_all_positions(), {(TypedGrid.STRING, 'a'): [CellPosition(col=0, row=0)],
+                                                            (TypedGrid.STRING, 'zz'): []})
+        df.iloc[0, 0] = 'zz'
+        self.assertEqual(batch_finder.get_all_positions(), {(TypedGrid.STRING, 'a'): [],
+                                                            (TypedGrid.STRING, 'zz'): [CellPosition(col=0, row=0)]})
+        self.assertFalse(has_grid(df))
+        batch_finder = BatchCellPositionsFinder(df=df, cell_values=[CellValue('zz')], use_index=True)
+        self.assertEqual(batch_finder.get_all_positions(), {(TypedGrid.STRING, 'zz'): [CellPosition(col=0, row=0)]})
+        self.assertTrue(has_grid(df))
+
+        # 0, False и 1, True - разные значения, 0 и 0.0 - одно
+        df = pd.DataFrame([[0, False, 0.0], [1, True, 1.0], [np.nan, '', 2 ** 60]], dtype=object)
+        batch_finder = BatchCellPositionsFinder(df=df, cell_values=[CellValue(0), CellValue(False), CellValue(1),
+                                                                    CellValue(True), CellValue(np.nan),
+                                                                    CellValue(2 ** 60)])
+        self.assertRaises(Exception, batch_finder.add, CellValue(0.0))
+        self.assertRaises(Exception, batch_finder.add, CellValue(''))
+        results = batch_finder.get_all_positions()
+        self.assertEqual(results[batch_finder.get_key(CellValue(0.0))], [CellPosition(row=0, col=0),
+                                                                         CellPosition(row=0, col=2)])
+        self.assertEqual(results[batch_finder.get_key(CellValue(False))], [CellPosition(row=0, col=1)])
+        self.assertEqual(results[batch_finder.get_key(CellValue(1))], [CellPosition(row=1, col=0),
+                                                                       CellPosition(row=1, col=2)])
+        self.assertEqual(results[batch_finder.get_key(CellValue(True))], [CellPosition(row=1, col=1)])
+        self.assertEqual(results[(TypedGrid.EMPTY, None)], [CellPosition(row=2, col=0), CellPosition(row=2, col=1)])
+        self.assertEqual(results[(TypedGrid.OTHER, 2 ** 60)], [CellPosition(row=2, col=2)])
+
+    def test_range_value_finder(self):
+        df = self.duplicates_df.copy()
+        df[7] = [True, 2 ** 60, 5, 'x', 1.5, None, 3, 2, 1, 0, -1, 100, '']
+        bounds = [(0, 10, True, True), (0, 10, False, False), (None, 1, True, True), (100, None, False, True),
+                  (2 ** 59, None, True, True), (4302, 4302, True, True)]
+        for min_value, max_value, include_min, include_max in bounds:
+            expected_mask = np.zeros(df.shape, dtype=bool)
+            for (row, col), value in np.ndenumerate(df.to_numpy(dtype=object)):
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and not pd.isnull(value):
+                    above_min = min_value is None or value > min_value or (include_min and value == min_value)
+                    below_max = max_value is None or value < max_value or (include_max and value == max_value)
+                    expected_mask[row, col] = above_min and below_max
+
+            finder = AllCellPositionsFinder(df=df)
+            finder.value_finder = RangeValueFinder(min_value=min_value, max_value=max_value, include_min=include_min,
+                                                   include_max=include_max)
+            np.testing.assert_array_equal(finder.get_positions_array(), np.argwhere(expected_mask))
+            finder.value_finder = RangeValueFinder(min_value=min_value, max_value=max_value, include_min=include_min,
+                                                   include_max=include_max, use_index=True)
+            np.testing.assert_array_equal(finder.get_positions_array(), np.argwhere(expected_mask))
+            sr_finder = AllRowNumsFinder(sr=df[7])
+            sr_finder.value_finder = RangeValueFinder(min_value=min_value, max_value=max_value,
+                                                      include_min=include_min, include_max=include_max)
+            self.assertEqual([position.row for position in sr_finder.get_position()],
+                             np.flatnonzero(expected_mask[:, 7]).tolist())
+
+        # Соседи и смещение
+        finder = AllCellPositionsFinder(df=self.duplicates_df)
+        finder.value_finder = RangeValueFinder(min_value=100000)
+        finder.neighbors_container = NeighborsContainer(neighbors=NeighborCell(
+            df=self.duplicates_df, cell_value=CellValue('Общий итог'), cell_offset=CellOffset(row=0, col=-6)))
+        finder.cell_offset_action = CellOffsetAction(cell_offset=CellOffset(row=0, col=-1))
+        self.assertEqual(finder.get_all_positions(), [CellPosition(row=11, col=5)])
+        self.assertRaises(Exception, RangeValueFinder)
+        self.assertRaises(Exception, RangeValueFinder, min_value=np.nan)
+
+        # Типизированные столбцы сравниваются целиком: int, float с NaN, bool и Int64 с пропусками
+        typed_df = pd.DataFrame({0: np.arange(6, dtype=np.int64), 1: [0.5, np.nan, 2.5, 3.0, -1.0, 9.0],
+                                 2: [True, False, True, True, False, True], 3: pd.array([1, None, 3, 4, None, 6])})
+        for use_index in [False, True]:
+            finder = AllCellPositionsFinder(df=typed_df)
+            finder.value_finder = RangeValueFinder(min_value=1, max_value=3, include_max=False, use_index=use_index)
+            self.assertEqual(finder.get_positions_array().tolist(), [[0, 3], [1, 0], [2, 0], [2, 1]])
+
+        # Без use_index изменения inplace видны сразу
+        df = pd.DataFrame([[1, 'x'], [50, 'y']], dtype=object)
+        finder = AllCellPositionsFinder(df=df)
+        finder.value_finder = RangeValueFinder(min_value=10)
+        self.assertEqual(finder.get_positions_array().tolist(), [[1, 0]])
+        df.iloc[0, 0] = 20
+        self.assertEqual(finder.get_positions_array().tolist(), [[0, 0], [1, 0]])
+
+    def test_contains_finder(self):
+        df = self.simple_df.copy()
+        df[7] = ['МЕТОПРОЛОЛ 250 МГ №' + str(row_num) if row_num % 3 else np.nan for row_num in range(df.shape[0])]
+        df[7] = df[7].astype('string')
+        values = ['250 МГ', 'МГ', 'Г', 'итог', 'НЕБИВОЛОЛ', '№30', '2,5МГ+6,25МГ №30', 'ОЛ-', 'nan', 'Qwerty', 'ГГГ']
+        for value in values:
+            expected_mask = np.zeros(df.shape, dtype=bool)
+            for col_num in get_string_columns(df).col_nums:
+                expected_mask[:, col_num] = df.iloc[:, col_num].astype(str).str.contains(value, regex=False,
+                                                                                         na=False)
+            for use_index in [False, True]:
+                finder = AllCellPositionsFinder(df=df)
+                finder.value_finder = ContainsFinder(cell_value=CellValue(value), use_index=use_index)
+                np.testing.assert_array_equal(finder.get_positions_array(), np.argwhere(expected_mask))
+                row_finder = AllRowNumsFinder(df=df)
+                row_finder.value_finder = ContainsFinder(cell_value=CellValue(value), use_index=use_index)
+                self.assertEqual([position.row for position in row_finder.get_position()],
+                                 np.flatnonzero(expected_mask.any(axis=1)).tolist())
+
+        trigram_index = get_string_columns(df).trigram_index
+        self.assertIs(get_string_columns(df).trigram_index, trigram_index)
+        codes = trigram_index.get_codes('ОЛ 250')
+        self.assertTrue(len(codes))
+        self.assertTrue(all('ОЛ 250' in get_string_columns(df).uniques[code] for code in codes))
+
+        sr_finder = AllRowNumsFinder(sr=self.duplicates_df[0])
+        sr_finder.value_finder = ContainsFinder(cell_value=CellValue('итог'))
+        self.assertEqual(sr_finder.get_all_positions(), [CellPosition(row=11)])
+
+    def test_normalization(self):
+        df = pd.DataFrame([['Общий  Итог ', 'всего', 'Ёлка'],
+                           ['общий итог', 'ИТОГ', 'елка большая'],
+                           [np.nan, 'итоговый', 'Зелёная ёлка']])
+        normalization = Normalization(unify_yo=True)
+        self.assertEqual(normalization('  Зелёная\t ЁЛКА '), 'зеленая елка')
+        self.assertEqual(normalization, Normalization(unify_yo=True))
+        self.assertNotEqual(normalization, Normalization())
+
+        cases = [(ExactValueFinder, 'ОБЩИЙ ИТОГ', [(0, 0), (1, 0)]),
+                 (StartWithFinder, 'итог', [(1, 1), (2, 1)]),
+                 (EndWithFinder, 'ЕЛКА', [(0, 2), (2, 2)]),
+                 (ContainsFinder, 'елка', [(0, 2), (1, 2), (2, 2)])]
+        for finder_class, value, expected in cases:
+            for use_index in [False, True]:
+                finder = AllCellPositionsFinder(df=df)
+                finder.value_finder = finder_class(cell_value=CellValue(value), use_index=use_index,
+                                                   normalization=normalization)
+                self.assertEqual([tuple(position) for position in finder.get_positions_array().tolist()], expected)
+        self.assertIs(get_string_columns(df).get_normalized(Normalization(unify_yo=True)),
+                      get_string_columns(df).get_normalized(normalization))
+
+        # Без use_index изменения inplace видны сразу
+        df_edit = df.copy()
+        finder = AllCellPositionsFinder(df=df_edit)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue('ОБЩИЙ ИТОГ'), normalization=normalization)
+        self.assertEqual(len(finder.get_positions_array()), 2)
+        df_edit.iloc[2, 0] = 'Общий итог'
+        self.assertEqual(finder.get_positions_array().tolist(), [[0, 0], [1, 0], [2, 0]])
+
+        # Числа, пустые строки и столбцы типа string: без use_index то же, что и по сетке
+        mixed_df = pd.DataFrame({0: [5, ' 5', '', 'Итог', None], 1: [5, 6, 7, 8, 9],
+                                 2: pd.array(['5', None, 'ИТОГ ', 'x', '5'], dtype='string')})
+        for value in ['5', 'итог', ' ']:
+            masks = []
+            for use_index in [False, True]:
+                value_finder = ExactValueFinder(cell_value=CellValue(value), use_index=use_index,
+                                                normalization=normalization)
+                value_finder.df = mixed_df
+                masks.append(value_finder.get_mask())
+            np.testing.assert_array_equal(masks[0], masks[1], err_msg=value)
+        self.assertEqual(np.argwhere(masks[0]).tolist(), [])
+
+        # Без нормализации регистр учитывается
+        finder = AllCellPositionsFinder(df=df)
+        finder.value_finder = ExactValueFinder(cell_value=CellValue('ОБЩИЙ ИТОГ'))
+        self.assertEqual(len(finder.get_positions_array()), 0)
+
+        sr_finder = AllRowNumsFinder(sr=self.duplicates_df[0])
+        sr_finder.value_finder = ExactValueFinder(cell_value=CellValue(' ОБЩИЙ ИТОГ'), normalization=Normalization())
+        self.assertEqual(sr_finder.get_all_positions(), [CellPosition(row=11)])
+
+    def test_excel_backends(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'simple.xlsx')
+            self.simple_df.to_excel(file_path, sheet_name='first', header=False, index=False)
+            expected_df = get_backend('pandas').read_sheet(file_path=file_path, sheet_name='first')
+            for name in get_available_backends():
+                df = ExcelDataProvider(file_path=file_path, backend=name).get_df(sheet_name='first')
+                pd.testing.assert_frame_equal(df, expected_df, obj=name)
+
+            # Типы столбцов те же, что у pd.read_excel: bool, строки, int, float, bool с пропусками, текст из цифр
+            mixed_path = os.path.join(tmp_dir, 'mixed.xlsx')
+            pd.DataFrame({0: [True, False, True], 1: ['a', None, 'c'], 2: [1, 2, 3], 3: [1.5, None, 2.0],
+                          4: [1, 'x', True], 5: [True, None, False], 6: ['1', '2', '3'],
+                          7: [datetime.datetime(2020, 1, 1), None, 'x']}).to_excel(mixed_path, header=False,
+                                                                                   index=False)
+            expected_df = pd.read_excel(mixed_path, header=None)
+            for name in get_available_backends():
+                df = get_backend(name).read_sheet(file_path=mixed_path, sheet_name=0)
+                pd.testing.assert_series_equal(df.dtypes, expected_df.dtypes, obj=name)
+                pd.testing.assert_frame_equal(df, expected_df, obj=name)
+            chunk_df = next(ExcelDataProvider(file_path=mixed_path).iter_chunks(sheet_name=0)).df
+            pd.testing.assert_frame_equal(chunk_df, expected_df)
+
+            benchmark_path = os.path.join(tmp_dir, 'benchmark.json')
+            throughputs = benchmark_backends(file_path=file_path, sheet_name='first', repeats=1,
+                                             benchmark_path=benchmark_path)
+            self.assertEqual(sorted(throughputs), sorted(get_available_backends()))
+            fastest = max(throughputs, key=lambda name: throughputs[name])
+            self.assertEqual(get_fastest_backend_name(benchmark_path=benchmark_path), fastest)
+            self.assertEqual(get_backend(AUTO_BACKEND, benchmark_path=benchmark_path).name, fastest)
+            # Без замеров - первый установленный по приоритету
+            self.assertIn(get_fastest_backend_name(benchmark_path=os.path.join(tmp_dir, 'absent.json')),
+                          get_available_backends())
+            self.assertRaises(Exception, get_backend, 'absent')
+
+    def test_text_providers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            excel_path = os.path.join(tmp_dir, 'simple.xlsx')
+            csv_path = os.path.join(tmp_dir, 'simple.csv')
+            tsv_path = os.path.join(tmp_dir, 'simple.tsv')
+            self.duplicates_df.to_excel(excel_path, header=False, index=False)
+            self.duplicates_df.to_csv(csv_path, header=False, index=False)
+            self.duplicates_df.to_csv(tsv_path, header=False, index=False, sep='\t')
+            expected_df = ExcelDataProvider(file_path=excel_path).get_df(sheet_name=0)
+            pd.testing.assert_frame_equal(CSVDataProvider(file_path=csv_path).get_df(), expected_df)
+            pd.testing.assert_frame_equal(TSVDataProvider(file_path=tsv_path).get_df(), expected_df)
+
+            cache = WorkbookCache()
+            df = CSVDataProvider(file_path=csv_path, cache=cache).get_df()
+            self.assertIs(CSVDataProvider(file_path=csv_path, cache=cache).get_df(), df)
+            for cell_value in [CellValue('SKU'), CellValue(0), CellValue(4302.0)]:
+                finder = AllCellPositionsFinder(df=df)
+                finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                expected_finder = AllCellPositionsFinder(df=expected_df)
+                expected_finder.value_finder = ExactValueFinder(cell_value=cell_value)
+                self._check_results(expected_result=expected_finder.get_all_positions(),
+                                    finder_result=finder.get_all_positions())
+
+            # Строки разной длины, пустая строка внутри файла и числа в текстовом столбце
+            ragged_path = os.path.join(tmp_dir, 'ragged.csv')
+            with open(ragged_path, 'w', encoding='utf-8') as ragged_file:
+                ragged_file.write('SKU,1\n\n007,2.50,,x\n"a,b",inf\n,,\n')
+            provider = CSVDataProvider(file_path=ragged_path)
+            df = provider.get_df()
+            self.assertEqual(df.shape, (4, 4))
+            self.assertEqual(df.iloc[:, 0].tolist()[::2], ['SKU', 7])
+            self.assertEqual(df.iloc[3, :2].tolist(), ['a,b', 'inf'])
+            self.assertEqual(df.iloc[2, 1], 2.5)
+            self.assertTrue(df.iloc[1].isnull().all())
+            chunks = list(provider.iter_chunks(rows_per_chunk=2))
+            self.assertEqual([(chunk.row_offset, chunk.df.shape) for chunk in chunks], [(0, (2, 4)), (2, (2, 4)),
+                                                                                        (4, (1, 4))])
+            pd.testing.assert_frame_equal(pd.concat([chunk.df for chunk in chunks[:2]], ignore_index=True), df,
+                                          check_dtype=False)
+
+            json_path = os.path.join(tmp_dir, 'grid.json')
+            with open(json_path, 'w', encoding='utf-8') as json_file:
+                json_file.write('[["SKU", 1.0, 2.5], [null, ""], ["Общий итог"]]')
+            df = JSONGridDataProvider(file_path=json_path).get_df()
+            self.assertEqual(df.shape, (3, 3))
+            self.assertEqual(df.iloc[0].tolist(), ['SKU', 1, 2.5])
+            self.assertTrue(df.iloc[1].isnull().all())
+            with open(json_path, 'w', encoding='utf-8') as json_file:
+                json_file.write('{"SKU": 1}')
+            self.assertRaises(Exception, JSONGridDataProvider(file_path=json_path).get_df)
+
+    def test_async_api(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'simple.csv')
+            self.simple_df.to_csv(file_path, header=False, index=False)
+            provider = CSVDataProvider(file_path=file_path)
+            executor = AsyncExecutor(max_workers=2)
+
+            async def load():
+                dfs = await asyncio.gather(*[provider.aget_df(executor=executor) for _ in range(4)])
+                df_filter = ByExcelCellLTRBFilterDF(df=dfs[0])
+                res_df = await df_filter.ares(ExcelCell('B5'), ExcelCell('C7'), executor=executor)
+                return dfs, res_df
+
+            dfs, res_df = asyncio.run(load())
+            expected_df = provider.get_df()
+            for df in dfs:
+                pd.testing.assert_frame_equal(df, expected_df)
+            pd.testing.assert_frame_equal(res_df, ByExcelCellLTRBFilterDF(df=expected_df).res(ExcelCell('B5'),
+                                                                                               ExcelCell('C7')))
+
+            # Пока вызов выполняется в пуле, цикл событий свободен, а ожидающий очереди вызов можно отменить
+            single_executor = AsyncExecutor(max_workers=1)
+            started = []
+
+            def blocking_call(name: str):
+                started.append(name)
+                time.sleep(0.2)
+                return name
+
+            async def cancel_waiting():
+                first = asyncio.ensure_future(single_executor.run(blocking_call, 'first'))
+                second = asyncio.ensure_future(single_executor.run(blocking_call, 'second'))
+                ticks = 0
+                while not first.done():
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+                    if ticks == 1:
+                        second.cancel()
+                return await first, second.cancelled(), ticks
+
+            first_res, second_cancelled, ticks = asyncio.run(cancel_waiting())
+            self.assertEqual((first_res, second_cancelled), ('first', True))
+            self.assertGreater(ticks, 1)
+            self.assertEqual(started, ['first'])
+            executor.shutdown()
+            single_executor.shutdown()
+
     def _check_results(self, expected_result: list, finder_result: list):
         self.assertEqual(len(expected_result), len(finder_result))
         for index, finder_cell_position in enumerate(finder_result):
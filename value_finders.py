@@ -1,67 +1,125 @@
-from typing import List
+import functools
+import re
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
-from pandas.core.dtypes.common import is_string_dtype
 
 from base_types import ValueFinderAbstract, CellValue
+from grids import Normalization, StringColumns, get_grid, get_string_columns
+
+# Сколько скомпилированных regex держать в кэше
+PATTERNS_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=PATTERNS_CACHE_SIZE)
+def compile_pattern(pattern: str) -> re.Pattern:
+    """
+    Скомпилированный regex. Повторные запросы с тем же шаблоном не компилируют его заново
+    """
+    return re.compile(pattern)
 
 
 class ExactValueFinder(ValueFinderAbstract):
     condition_type = 'exact_cell_value'
+    cell_wise = True
 
-    def __init__(self, cell_value: CellValue):
+    def __init__(self, cell_value: CellValue, use_index: bool = False, normalization: Normalization = None):
+        """
+        :param use_index: искать по общей сетке df (см. get_grid): маска - по плоскости типа значения
+        (см. TypedGrid.eq_mask), позиции - по инвертированному индексу значений (см. ValueIndex).
+        Сетка строится один раз на df и окупается, если по одному df ищется много значений.
+        Изменения ячеек df inplace индекс не видит: после них нужен invalidate_grid(df).
+        :param normalization: сравнивать строки после приведения (см. Normalization), например без учёта регистра.
+        На нестроковые значения не влияет. С use_index приведённые строки кэшируются вместе с индексом
+        """
         self._cell_value = cell_value
+        self._use_index = use_index
+        self._normalization = normalization if isinstance(cell_value.value, str) else None
         super().__init__()
 
     def get_all_indexes(self, axis: int) -> np.array:
-        if self._cell_value:
+        if self.df is not None:
+            if self._use_index:
+                return self._positions_to_indexes(positions=self._get_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
+
+        if self._normalization is not None:
+            seria = _normalize_seria(self.sr, self._normalization).eq(self._normalization(self._cell_value.value))
+        elif self._cell_value:
             # cell_value не пустое значение
-            if self.df is not None:
-                seria = self.df[self.df.eq(self._cell_value.value)].notna().any(axis=axis)
-            else:
-                seria = self.sr.eq(self._cell_value.value)
+            seria = self.sr.eq(self._cell_value.value)
         else:
             # exact_cell_value пустое значение.
             # Пустым значением могут быть варианты: '', None, np.NaN.
-            # С None и np.NaN функция .isnull() справится, т.е. поставит True в нужную позицию.
-            # А вот с '' не справится и поставит False. Потому предварительно '' необходимо заменить на None.
-            if self.df is not None:
-                seria = self.df.replace(to_replace={'': None}).isnull().any(axis=axis)
-            else:
-                seria = self.sr.replace(to_replace={'': None}).isnull()
+            seria = _get_empty_seria(self.sr)
 
         res = seria[seria].index.values
         return res
 
+    def get_mask(self) -> np.ndarray:
+        if self._use_index:
+            # Маска по плоскости сетки, соответствующей типу значения. Индекс значений для неё не нужен
+            grid = get_grid(self.df)
+            if self._normalization is not None:
+                mask = grid.normalized_eq_mask(value=self._cell_value.value, normalization=self._normalization)
+            elif self._cell_value:
+                mask = grid.eq_mask(self._cell_value.value)
+            else:
+                mask = grid.empty.copy()
+        elif self._normalization is not None:
+            mask = _get_normalized_eq_mask(df=self.df, value=self._cell_value.value, normalization=self._normalization)
+        elif self._cell_value:
+            mask = self.df.eq(self._cell_value.value).to_numpy(dtype=bool, na_value=False)
+        else:
+            mask = _get_empty_mask(self.df)
+        return mask
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        return self._get_positions() if self._use_index else None
+
+    def _get_positions(self) -> np.ndarray:
+        grid = get_grid(self.df)
+        value_index = grid.value_index
+        if self._normalization is not None:
+            positions = value_index.lookup_string_codes(
+                grid.get_normalized_codes(value=self._cell_value.value, normalization=self._normalization))
+        elif self._cell_value:
+            positions = value_index.lookup(self._cell_value.value)
+        else:
+            positions = value_index.empty_positions
+        return positions
+
 
 class ExactValuesFinder(ValueFinderAbstract):
     condition_type = 'exact_cell_values'
+    cell_wise = True
 
-    def __init__(self, cell_values: List[CellValue]):
+    def __init__(self, cell_values: List[CellValue], use_index: bool = False):
+        """
+        :param use_index: см. ExactValueFinder
+        """
         self._cell_values = cell_values
+        self._use_index = use_index
         super().__init__()
 
     def get_all_indexes(self, axis: int) -> np.array:
-        values = list(set([cell_value.value for cell_value in self._cell_values]))
-        values_wo_nulls = [value for value in values if not pd.isnull(value)]
-        empty_value_exists = any(pd.isnull(values))
+        if self.df is not None:
+            if self._use_index:
+                return self._positions_to_indexes(positions=self._get_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
+
+        values_wo_nulls, empty_value_exists = self._split_values()
+
         seria_nulls = None
         seria_wo_nulls = None
         if empty_value_exists:
-            # В списке есть пустое значение, значит предстоит проверка на пустое значение. Значит необходимо
-            # '' заменить на None в df
-            if self.df is not None:
-                seria_nulls = self.df.replace(to_replace={'': None}).isnull().any(axis=axis)
-            else:
-                seria_nulls = self.sr.replace(to_replace={'': None}).isnull()
+            # В списке есть пустое значение, значит предстоит проверка на пустое значение
+            seria_nulls = _get_empty_seria(self.sr)
 
         if len(values_wo_nulls):
             # В списке есть реальные значения
-            if self.df is not None:
-                seria_wo_nulls = self.df[self.df.isin(values_wo_nulls)].notna().any(axis=axis)
-            else:
-                seria_wo_nulls = self.sr.isin(values_wo_nulls)
+            seria_wo_nulls = self.sr.isin(values_wo_nulls)
 
         if seria_nulls is not None and seria_wo_nulls is not None:
             seria = seria_nulls + seria_wo_nulls
@@ -72,6 +130,121 @@ class ExactValuesFinder(ValueFinderAbstract):
         res = seria[seria].index.values
         return res
 
+    def get_mask(self) -> np.ndarray:
+        values_wo_nulls, empty_value_exists = self._split_values()
+        if self._use_index:
+            grid = get_grid(self.df)
+            mask = grid.isin_mask(values_wo_nulls)
+            if empty_value_exists:
+                mask |= grid.empty
+        else:
+            mask = self.df.isin(values_wo_nulls).to_numpy(dtype=bool, na_value=False)
+            if empty_value_exists:
+                mask |= _get_empty_mask(self.df)
+        return mask
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        return self._get_positions() if self._use_index else None
+
+    def _get_positions(self) -> np.ndarray:
+        values_wo_nulls, empty_value_exists = self._split_values()
+        value_index = get_grid(self.df).value_index
+        positions = value_index.lookup_many(values_wo_nulls)
+        if empty_value_exists:
+            positions = np.union1d(positions, value_index.empty_positions)
+        return positions
+
+    def _split_values(self) -> tuple:
+        """
+        Непустые значения без повторов и признак, что среди значений есть пустое
+        """
+        values = list(set([cell_value.value for cell_value in self._cell_values]))
+        values_wo_nulls = [value for value in values if not pd.isnull(value)]
+        empty_value_exists = any(pd.isnull(values))
+        return values_wo_nulls, empty_value_exists
+
+
+class RangeValueFinder(ValueFinderAbstract):
+    """
+    Числовые ячейки со значением в диапазоне от min_value до max_value. Граница None - без ограничения,
+    например "больше 100": RangeValueFinder(min_value=100, include_min=False).
+    Строки, bool и пустые ячейки не подходят. Числа сравниваются с границами векторно по столбцам,
+    с use_index - бинарным поиском по отсортированным числам индекса значений (см. ValueIndex).
+    """
+    condition_type = 'range'
+    cell_wise = True
+
+    def __init__(self, min_value=None, max_value=None, include_min: bool = True, include_max: bool = True,
+                 use_index: bool = False):
+        """
+        :param use_index: искать по индексу значений df из общего кэша (см. get_grid). Индекс строится один раз
+        на df и окупается на повторных запросах. Изменения ячеек df inplace индекс не видит:
+        после них нужен invalidate_grid(df).
+        """
+        if min_value is None and max_value is None:
+            raise Exception('At least one of the "min_value" and "max_value" must be specified')
+        if any(value is not None and pd.isnull(value) for value in [min_value, max_value]):
+            raise Exception('The range bounds must not be NaN')
+        self._min_value = min_value
+        self._max_value = max_value
+        self._include_min = include_min
+        self._include_max = include_max
+        self._use_index = use_index
+        super().__init__()
+
+    def get_all_indexes(self, axis: int) -> np.array:
+        if self.df is not None:
+            if self._use_index:
+                return self._positions_to_indexes(positions=self._get_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
+
+        res = self.sr.index.values[self._get_seria_mask(self.sr)]
+        return res
+
+    def get_mask(self) -> np.ndarray:
+        mask = np.zeros(self.df.shape, dtype=bool)
+        if self._use_index:
+            mask.flat[self._get_positions()] = True
+        else:
+            for col_num in range(self.df.shape[1]):
+                mask[:, col_num] = self._get_seria_mask(self.df.iloc[:, col_num])
+        return mask
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        return self._get_positions() if self._use_index else None
+
+    def _get_positions(self) -> np.ndarray:
+        return get_grid(self.df).value_index.lookup_range(min_value=self._min_value, max_value=self._max_value,
+                                                          include_min=self._include_min,
+                                                          include_max=self._include_max)
+
+    def _get_seria_mask(self, sr: pd.Series) -> np.ndarray:
+        """
+        Маска чисел серии в диапазоне. Числовая серия сравнивается целиком, в остальных - только числа,
+        как python объекты, поэтому большие int сравниваются точно
+        """
+        if isinstance(sr.dtype, np.dtype) and sr.dtype.kind in 'iuf':
+            return self._in_range(sr.to_numpy())
+
+        mask = np.zeros(len(sr), dtype=bool)
+        if isinstance(sr.dtype, np.dtype) and sr.dtype.kind == 'b':
+            return mask
+        values = sr.to_numpy(dtype=object)
+        numbers_mask = np.frompyfunc(_is_range_number, 1, 1)(values).astype(bool)
+        if numbers_mask.any():
+            mask[numbers_mask] = self._in_range(values[numbers_mask])
+        return mask
+
+    def _in_range(self, values: np.ndarray) -> np.ndarray:
+        # NaN не попадает ни в один диапазон: сравнения с ним ложны
+        mask = np.ones(len(values), dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self._min_value is not None:
+                mask &= values >= self._min_value if self._include_min else values > self._min_value
+            if self._max_value is not None:
+                mask &= values <= self._max_value if self._include_max else values < self._max_value
+        return mask
+
 
 class RegexFinder(ValueFinderAbstract):
     """
@@ -79,56 +252,300 @@ class RegexFinder(ValueFinderAbstract):
     """
     condition_type = 'regex'
 
-    def __init__(self, cell_value: CellValue):
+    def __init__(self, cell_value: CellValue, use_index: bool = False):
+        """
+        :param use_index: брать строковые столбцы df из общего кэша (см. get_string_columns), а не приводить заново.
+        Окупается на повторных запросах к одному df. Изменения ячеек df inplace кэш не видит:
+        после них нужен invalidate_grid(df).
+        """
         self._cell_value = cell_value
+        self._use_index = use_index
         super().__init__()
 
     def get_all_indexes(self, axis: int) -> np.array:
         pattern = self._cell_value.value
         if self.df is not None:
-            seria = self.df. \
-                apply(lambda s: s.astype(str).str.match(pattern, na=False) if is_string_dtype(s) else False). \
-                any(axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
         else:
             # Т.к. это regex, то необходимо обязательно конвертировать в строку
             seria = self.sr.astype(str).str.match(pattern, na=False)
         res = seria[seria].index.values
         return res
 
+    def get_mask(self) -> np.ndarray:
+        # Шаблон проверяется только на различных строках листа, а не на каждой ячейке
+        string_columns = _get_string_columns(self.df, cached=self._use_index)
+        regex = compile_pattern(self._cell_value.value)
+        uniques_mask = np.array([regex.match(value) is not None for value in string_columns.uniques], dtype=bool)
+        return string_columns.uniques_mask_to_mask(uniques_mask)
+
+
+class RegexesFinder(ValueFinderAbstract):
+    """
+    Поиск сразу по нескольким regex за один проход по различным строкам листа.
+    Ячейка подходит, если совпала хотя бы с одним шаблоном. Как и RegexFinder, только для строковых столбцов.
+    """
+    condition_type = 'regexes'
+
+    def __init__(self, cell_values: List[CellValue], use_index: bool = False):
+        """
+        :param use_index: см. RegexFinder
+        """
+        self._cell_values = cell_values
+        self._use_index = use_index
+        super().__init__()
+
+    @property
+    def patterns(self) -> List[str]:
+        """
+        Шаблоны без повторов в исходном порядке
+        """
+        return list(dict.fromkeys(cell_value.value for cell_value in self._cell_values))
+
+    def get_all_indexes(self, axis: int) -> np.array:
+        if self.df is not None:
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
+
+        codes, uniques = pd.factorize(self.sr.astype(str))
+        uniques_mask = self._match_uniques(uniques=uniques).any(axis=0)
+        seria = pd.Series(np.append(uniques_mask, False)[codes], index=self.sr.index)
+        res = seria[seria].index.values
+        return res
+
+    def get_mask(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index)
+        return string_columns.uniques_mask_to_mask(self._match_uniques(uniques=string_columns.uniques).any(axis=0))
+
+    def get_masks_by_pattern(self) -> Dict[str, np.ndarray]:
+        """
+        Шаблон -> маска размера df
+        """
+        string_columns = _get_string_columns(self.df, cached=self._use_index)
+        matches = self._match_uniques(uniques=string_columns.uniques)
+        return {pattern: string_columns.uniques_mask_to_mask(uniques_mask)
+                for pattern, uniques_mask in zip(self.patterns, matches)}
+
+    def get_positions_by_pattern(self) -> Dict[str, np.ndarray]:
+        """
+        Шаблон -> позиции совпавших ячеек массивом N x 2 (строка, столбец) построчно, как в
+        AllCellPositionsFinder.get_positions_array
+        """
+        res = {}
+        for pattern, mask in self.get_masks_by_pattern().items():
+            rows, cols = np.nonzero(mask)
+            res[pattern] = np.stack([self.df.index.values[rows], self.df.columns.values[cols]], axis=1)
+        return res
+
+    def _match_uniques(self, uniques) -> np.ndarray:
+        """
+        Матрица совпадений: шаблон x различная строка
+        """
+        regexes = [compile_pattern(pattern) for pattern in self.patterns]
+        matches = np.zeros((len(regexes), len(uniques)), dtype=bool)
+        for value_num, value in enumerate(uniques):
+            for regex_num, regex in enumerate(regexes):
+                if regex.match(value) is not None:
+                    matches[regex_num, value_num] = True
+        return matches
+
 
 class StartWithFinder(ValueFinderAbstract):
     condition_type = 'start_with'
 
-    def __init__(self, cell_value: CellValue):
+    def __init__(self, cell_value: CellValue, use_index: bool = False, normalization: Normalization = None):
+        """
+        :param use_index: искать бинарным поиском по отсортированным различным строкам df (см. AffixIndex).
+        Индекс строится один раз на df и окупается на повторных запросах к большому листу.
+        :param normalization: сравнивать строки после приведения (см. Normalization).
+        С use_index приведённые строки и их индексы кэшируются для df.
+        Изменения ячеек df inplace индекс не видит: после них нужен invalidate_grid(df).
+        """
         self._cell_value = cell_value
+        self._use_index = use_index
+        self._normalization = normalization
         super().__init__()
 
     def get_all_indexes(self, axis: int) -> np.array:
-        value = self._cell_value.value
+        value = _normalize_value(self._cell_value.value, self._normalization)
         if self.df is not None:
-            seria = self.df. \
-                apply(lambda s: s.astype(str).str.startswith(value, na=False) if is_string_dtype(s) else False). \
-                any(axis=axis)
+            if self._use_index:
+                return self._positions_to_indexes(positions=self.get_flat_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
         else:
-            seria = self.sr.str.startswith(value, na=False)
+            seria = _normalize_seria(self.sr, self._normalization).str.startswith(value, na=False)
         res = seria[seria].index.values
         return res
 
+    def get_mask(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        if self._use_index:
+            return string_columns.positions_to_mask(self._get_positions())
+        value = _normalize_value(self._cell_value.value, self._normalization)
+        return string_columns.get_mask(func=lambda seria: seria.str.startswith(value, na=False))
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        if not self._use_index:
+            return None
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return np.sort(string_columns.to_flat_positions(self._get_positions()))
+
+    def _get_positions(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return string_columns.affix_index.startswith(_normalize_value(self._cell_value.value, self._normalization))
+
 
 class EndWithFinder(ValueFinderAbstract):
     condition_type = 'end_with'
 
-    def __init__(self, cell_value: CellValue):
+    def __init__(self, cell_value: CellValue, use_index: bool = False, normalization: Normalization = None):
+        """
+        :param use_index: см. StartWithFinder
+        :param normalization: см. StartWithFinder
+        """
+        self._cell_value = cell_value
+        self._use_index = use_index
+        self._normalization = normalization
+        super().__init__()
+
+    def get_all_indexes(self, axis: int) -> np.array:
+        value = _normalize_value(self._cell_value.value, self._normalization)
+        if self.df is not None:
+            if self._use_index:
+                return self._positions_to_indexes(positions=self.get_flat_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
+        else:
+            seria = _normalize_seria(self.sr, self._normalization).str.endswith(value, na=False)
+        res = seria[seria].index.values
+        return res
+
+    def get_mask(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        if self._use_index:
+            return string_columns.positions_to_mask(self._get_positions())
+        value = _normalize_value(self._cell_value.value, self._normalization)
+        return string_columns.get_mask(func=lambda seria: seria.str.endswith(value, na=False))
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        if not self._use_index:
+            return None
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return np.sort(string_columns.to_flat_positions(self._get_positions()))
+
+    def _get_positions(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return string_columns.affix_index.endswith(_normalize_value(self._cell_value.value, self._normalization))
+
+
+class ContainsFinder(ValueFinderAbstract):
+    """
+    Ячейки, содержащие подстроку. Как и RegexFinder, только для строковых столбцов
+    """
+    condition_type = 'contains'
+
+    def __init__(self, cell_value: CellValue, use_index: bool = False, normalization: Normalization = None):
+        """
+        :param use_index: сужать кандидатов по индексу триграмм различных строк df (см. TrigramIndex).
+        Индекс строится один раз на df и окупается на повторных запросах к большому листу.
+        :param normalization: см. StartWithFinder
+        """
         self._cell_value = cell_value
+        self._use_index = use_index
+        self._normalization = normalization
         super().__init__()
 
     def get_all_indexes(self, axis: int) -> np.array:
-        value = self._cell_value.value
+        value = _normalize_value(self._cell_value.value, self._normalization)
         if self.df is not None:
-            seria = self.df. \
-                apply(lambda s: s.astype(str).str.endswith(value, na=False) if is_string_dtype(s) else False). \
-                any(axis=axis)
+            if self._use_index:
+                return self._positions_to_indexes(positions=self.get_flat_positions(), axis=axis)
+            return self._mask_to_indexes(mask=self.get_mask(), axis=axis)
         else:
-            seria = self.sr.str.endswith(value, na=False)
+            seria = _normalize_seria(self.sr.astype(str), self._normalization)
+            seria = seria.str.contains(value, regex=False, na=False)
         res = seria[seria].index.values
-        return res
\ No newline at end of file
+        return res
+
+    def get_mask(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        if self._use_index:
+            return string_columns.positions_to_mask(self._get_positions())
+        value = _normalize_value(self._cell_value.value, self._normalization)
+        return string_columns.get_mask(func=lambda seria: seria.str.contains(value, regex=False, na=False))
+
+    def get_flat_positions(self) -> [np.ndarray, None]:
+        if not self._use_index:
+            return None
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return np.sort(string_columns.to_flat_positions(self._get_positions()))
+
+    def _get_positions(self) -> np.ndarray:
+        string_columns = _get_string_columns(self.df, cached=self._use_index, normalization=self._normalization)
+        return string_columns.trigram_index.contains(_normalize_value(self._cell_value.value, self._normalization))
+
+
+def _is_range_number(value) -> bool:
+    # bool - не число для диапазона, хотя и подкласс int
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _get_empty_seria(sr: pd.Series) -> pd.Series:
+    """
+    Пустые значения серии: None, NaN и ''. Серия не копируется, как при replace('' -> None)
+    """
+    seria = sr.isnull()
+    if not isinstance(sr.dtype, np.dtype) or sr.dtype.kind == 'O':
+        # '' может быть только в строковых и object сериях
+        seria |= sr.eq('').to_numpy(dtype=bool, na_value=False)
+    return seria
+
+
+def _get_empty_mask(df: pd.DataFrame) -> np.ndarray:
+    """
+    Маска пустых ячеек df (None, NaN, ''). Считается по столбцам, df не копируется
+    """
+    mask = np.zeros(df.shape, dtype=bool)
+    for col_num in range(df.shape[1]):
+        mask[:, col_num] = _get_empty_seria(df.iloc[:, col_num]).to_numpy(dtype=bool)
+    return mask
+
+
+def _get_normalized_eq_mask(df: pd.DataFrame, value: str, normalization: Normalization) -> np.ndarray:
+    """
+    Маска строковых ячеек df, равных value после приведения normalization.
+    Приводятся только различные строки каждого столбца, числовые столбцы не просматриваются
+    """
+    value = normalization(value)
+    mask = np.zeros(df.shape, dtype=bool)
+    for col_num in range(df.shape[1]):
+        seria = df.iloc[:, col_num]
+        if isinstance(seria.dtype, np.dtype) and seria.dtype.kind != 'O':
+            continue
+        codes, uniques = pd.factorize(seria)
+        # '' - пустое значение, с ним строки не сравниваются
+        uniques_mask = np.array([isinstance(unique, str) and unique != '' and normalization(unique) == value
+                                 for unique in uniques], dtype=bool)
+        if uniques_mask.any():
+            mask[:, col_num] = np.append(uniques_mask, False)[codes]
+    return mask
+
+
+def _normalize_value(value: str, normalization: [Normalization, None]) -> str:
+    return value if normalization is None else normalization(value)
+
+
+def _normalize_seria(sr: pd.Series, normalization: [Normalization, None]) -> pd.Series:
+    """
+    Серия с приведёнными строками. Остальные значения не меняются
+    """
+    if normalization is None:
+        return sr
+    return sr.map(lambda value: normalization(value) if isinstance(value, str) else value)
+
+
+def _get_string_columns(df: pd.DataFrame, cached: bool, normalization: Normalization = None) -> StringColumns:
+    """
+    Строковые столбцы df: из общего кэша, если cached, иначе приведённые заново,
+    т.к. изменения ячеек inplace кэш не видит
+    """
+    string_columns = get_string_columns(df) if cached else StringColumns(df)
+    return string_columns if normalization is None else string_columns.get_normalized(normalization)